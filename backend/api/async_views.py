@@ -0,0 +1,169 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import Http404
+from django.urls import re_path
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+async def aevaluate(queryset):
+    """
+    Выполнение запроса через асинхронный ORM.
+
+    QuerySet.aiterator() в Django 4.2 не поддерживает prefetch_related,
+    поэтому связанные объекты догружаются отдельно в sync_to_async.
+    """
+    lookups = queryset._prefetch_related_lookups
+    objects = [
+        obj async for obj in queryset.prefetch_related(None).aiterator()
+    ]
+    if lookups and objects:
+        await sync_to_async(prefetch_related_objects)(objects, *lookups)
+    return objects
+
+
+class AsyncReadOnlyMixin:
+    """
+    Асинхронные варианты list и retrieve для вьюсетов.
+
+    Фильтрация и проверки прав выполняются через sync_to_async,
+    выборка строк и подсчёт — асинхронным ORM.
+    """
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset()
+        )
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(
+                queryset, request, view=self
+            )
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(
+            await aevaluate(queryset), many=True
+        )
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+    async def aget_object(self):
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset()
+        )
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = await queryset.filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).prefetch_related(None).afirst()
+        if obj is None:
+            raise Http404
+        lookups = queryset._prefetch_related_lookups
+        if lookups:
+            await sync_to_async(prefetch_related_objects)([obj], *lookups)
+        await sync_to_async(self.check_object_permissions)(self.request, obj)
+        return obj
+
+
+db_slots = None
+
+
+def get_db_slots():
+    """
+    Ограничение числа одновременно обрабатываемых запросов в процессе.
+
+    Каждый асинхронный запрос держит собственное соединение с БД,
+    поэтому без ограничения сотни открытых соединений упираются
+    в max_connections PostgreSQL.
+    """
+    global db_slots
+    if db_slots is None:
+        db_slots = asyncio.Semaphore(settings.ASYNC_API_DB_CONCURRENCY)
+    return db_slots
+
+
+def async_view(viewset, actions, **initkwargs):
+    """
+    Асинхронное представление вьюсета для маршрутов router.
+
+    GET и HEAD с ответом в JSON обрабатываются методами
+    a<действие> вьюсета, остальные запросы — обычным
+    синхронным представлением через sync_to_async.
+    """
+    sync_view = viewset.as_view(actions, **initkwargs)
+    sync_handler = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        async with get_db_slots():
+            return await handle(request, *args, **kwargs)
+
+    async def handle(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return await sync_handler(request, *args, **kwargs)
+        self = viewset(**initkwargs)
+        self.action_map = {"head": actions["get"], **actions}
+        for method, action in self.action_map.items():
+            setattr(self, method, getattr(self, action))
+        self.args, self.kwargs = args, kwargs
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if isinstance(request.accepted_renderer, JSONRenderer):
+                handler = getattr(self, f"a{self.action}")
+            else:
+                handler = sync_to_async(getattr(self, self.action))
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    view.csrf_exempt = True
+    view.cls = viewset
+    view.initkwargs = initkwargs
+    view.actions = actions
+    return view
+
+
+def async_urlpatterns(router):
+    """
+    Маршруты router для вьюсетов с AsyncReadOnlyMixin, в которых list
+    и retrieve обслуживаются асинхронно. Порядок маршрутов тот же, что
+    у router, поэтому их нужно подключать перед router.urls.
+    """
+    urlpatterns = []
+    for prefix, viewset, basename in router.registry:
+        if not issubclass(viewset, AsyncReadOnlyMixin):
+            continue
+        lookup = router.get_lookup_regex(viewset)
+        for route in router.get_routes(viewset):
+            mapping = router.get_method_map(viewset, route.mapping)
+            if not mapping:
+                continue
+            regex = route.url.format(
+                prefix=prefix,
+                lookup=lookup,
+                trailing_slash=router.trailing_slash,
+            )
+            initkwargs = {
+                **route.initkwargs,
+                "basename": basename,
+                "detail": route.detail,
+            }
+            if mapping.get("get") in ("list", "retrieve"):
+                view = async_view(viewset, mapping, **initkwargs)
+            else:
+                view = viewset.as_view(mapping, **initkwargs)
+            urlpatterns.append(
+                re_path(regex, view, name=route.name.format(basename=basename))
+            )
+    return urlpatterns
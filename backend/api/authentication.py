@@ -0,0 +1,109 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class TokenCache:
+    """
+    Снимки токенов вместе с пользователями.
+
+    Снимок хранится в LRU процесса (не больше TOKEN_CACHE_MAX_SIZE
+    записей, TOKEN_CACHE_LOCAL_TIMEOUT секунд) и, если кэш по умолчанию
+    общий для процессов (CACHE_IS_SHARED), в нём на TOKEN_CACHE_TIMEOUT
+    секунд. Снимки хранятся сериализованными, чтобы каждый запрос
+    получал собственный экземпляр пользователя.
+
+    Сброс удаляет снимок из общего кэша и из LRU своего процесса,
+    остальные процессы перестают его использовать не позже чем через
+    TOKEN_CACHE_LOCAL_TIMEOUT секунд. Кэш в памяти процесса вторым
+    уровнем не используется: сброс в нём не виден другим процессам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def cache_key(key):
+        return f"api:token:{key}"
+
+    def get(self, key):
+        """Токен с пользователем из кэша или None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, data = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return pickle.loads(data)
+                del self._entries[key]
+        if not settings.CACHE_IS_SHARED:
+            return None
+        data = cache.get(self.cache_key(key))
+        if data is None:
+            return None
+        self._remember(key, data, now)
+        return pickle.loads(data)
+
+    def set(self, token):
+        data = pickle.dumps(token)
+        if settings.CACHE_IS_SHARED:
+            cache.set(
+                self.cache_key(token.key), data, settings.TOKEN_CACHE_TIMEOUT
+            )
+        self._remember(token.key, data, time.monotonic())
+
+    def delete(self, keys):
+        keys = list(keys)
+        if settings.CACHE_IS_SHARED:
+            cache.delete_many([self.cache_key(key) for key in keys])
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def _remember(self, key, data, now):
+        with self._lock:
+            expires = now + settings.TOKEN_CACHE_LOCAL_TIMEOUT
+            self._entries[key] = (expires, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_MAX_SIZE:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без запроса к базе для токенов из кэша.
+
+    Снимки сбрасываются сигналами при удалении токена и сохранении
+    пользователя: смене пароля, деактивации, изменении профиля.
+    Счётчик рецептов в снимок не входит: он меняется без сигналов,
+    и сохранение пользователя из снимка не должно его перезаписывать.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = (
+                    model.objects.select_related("user")
+                    .defer("user__recipes_count")
+                    .get(key=key)
+                )
+            except model.DoesNotExist:
+                raise AuthenticationFailed(_("Invalid token."))
+            token_cache.set(token)
+        if not token.user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        return (token.user, token)
@@ -0,0 +1,146 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags
+
+
+def version_key(model):
+    return f"api:{model._meta.label_lower}:version"
+
+
+def get_version(model):
+    """Текущая версия данных модели."""
+    return cache.get_or_set(version_key(model), time.time_ns, timeout=None)
+
+
+async def aget_version(model):
+    """Асинхронный вариант get_version."""
+    return await cache.aget_or_set(
+        version_key(model), time.time_ns, timeout=None
+    )
+
+
+def bump_version(model):
+    """
+    Смена версии данных модели, делающая устаревшими ответы в кэше.
+    Возвращает новую версию.
+    """
+    try:
+        return cache.incr(version_key(model))
+    except ValueError:
+        version = time.time_ns()
+        cache.set(version_key(model), version, timeout=None)
+        return version
+
+
+class CachedResponseMixin:
+    """
+    Кэширование сериализованных ответов list и retrieve.
+
+    Ключ ответа включает версию данных cache_model, которая меняется
+    сигналами при сохранении и удалении объектов. Ответ отдаётся
+    с weak ETag, на совпадающий If-None-Match возвращается 304.
+
+    Ответы кэшируются, только если кэш общий для процессов
+    (CACHE_IS_SHARED): в памяти процесса смена версии не видна
+    остальным процессам, и они отдавали бы устаревшие ответы
+    до API_CACHE_TIMEOUT секунд. Без общего кэша ответ собирается
+    заново, ETag и 304 сохраняются.
+    """
+
+    cache_model = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(
+            super().alist, request, *args, **kwargs
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(
+            super().aretrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != "json":
+            return handler(request, *args, **kwargs)
+        if not settings.CACHE_IS_SHARED:
+            return self.uncached_response(
+                request, handler(request, *args, **kwargs)
+            )
+        key = self.response_key(request, get_version(self.cache_model))
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = self.cache_entry(request, response)
+            cache.set(key, entry, settings.API_CACHE_TIMEOUT)
+        return self.entry_response(request, entry)
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        """Асинхронный вариант cached_response."""
+        if request.accepted_renderer.format != "json":
+            return await handler(request, *args, **kwargs)
+        if not settings.CACHE_IS_SHARED:
+            return self.uncached_response(
+                request, await handler(request, *args, **kwargs)
+            )
+        key = self.response_key(request, await aget_version(self.cache_model))
+        entry = await cache.aget(key)
+        if entry is None:
+            response = await handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = self.cache_entry(request, response)
+            await cache.aset(key, entry, settings.API_CACHE_TIMEOUT)
+        return self.entry_response(request, entry)
+
+    def uncached_response(self, request, response):
+        """Ответ с ETag без сохранения в кэше."""
+        if response.status_code != 200:
+            return response
+        return self.entry_response(
+            request, self.cache_entry(request, response)
+        )
+
+    def response_key(self, request, version):
+        return (
+            f"api:response:{self.cache_model._meta.label_lower}:{version}:"
+            f"{hashlib.md5(request.get_full_path().encode()).hexdigest()}"
+        )
+
+    def cache_entry(self, request, response):
+        """Отрендеренный ответ и его ETag для сохранения в кэше."""
+        content = request.accepted_renderer.render(
+            response.data,
+            request.accepted_media_type,
+            self.get_renderer_context(),
+        )
+        return f'W/"{hashlib.md5(content).hexdigest()}"', content
+
+    def entry_response(self, request, entry):
+        """Ответ из кэша или 304 при совпадении If-None-Match."""
+        etag, content = entry
+        if_none_match = [
+            tag.removeprefix("W/")
+            for tag in parse_etags(request.headers.get("If-None-Match", ""))
+        ]
+        if "*" in if_none_match or etag.removeprefix("W/") in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                content, content_type=request.accepted_renderer.media_type
+            )
+        response["ETag"] = etag
+        return response
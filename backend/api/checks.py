@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.db import connections
+
+
+def database_settings(alias="default"):
+    """Действующие настройки соединения с БД в виде строки для журнала."""
+    options = connections[alias].settings_dict
+    return (
+        f"database {alias!r}: {options['HOST'] or 'localhost'}:"
+        f"{options['PORT'] or 5432}/{options['NAME']}, "
+        f"CONN_MAX_AGE={options['CONN_MAX_AGE']}, "
+        f"CONN_HEALTH_CHECKS={options['CONN_HEALTH_CHECKS']}, "
+        "DISABLE_SERVER_SIDE_CURSORS="
+        f"{options['DISABLE_SERVER_SIDE_CURSORS']}"
+    )
+
+
+@register()
+def check_database_settings(app_configs, **kwargs):
+    """Проверка сочетания настроек соединения с БД."""
+    options = connections["default"].settings_dict
+    errors = []
+    if settings.ASYNC_API and options["CONN_MAX_AGE"] != 0:
+        errors.append(
+            Warning(
+                "Persistent database connections are not reused by the "
+                "async API.",
+                hint="Set DB_CONN_MAX_AGE=0 when ASYNC_API=True.",
+                id="api.W001",
+            )
+        )
+    return errors
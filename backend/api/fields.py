@@ -1,17 +1,64 @@
 import base64
+import binascii
+import tempfile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
 from rest_framework import serializers
 
+BASE64_CHUNK_SIZE = 64 * 1024
+
 
 class Base64ImageField(serializers.ImageField):
     """
     Класс для сериализации изображений в формате base64.
     """
 
+    default_error_messages = {
+        "max_size": "Размер изображения не должен превышать {max_size} байт.",
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
             format, imgstr = data.split(";base64,")
             ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f"temp.{ext}")
-        return super().to_internal_value(data)
+            data = File(self.decode(imgstr), name=f"temp.{ext}")
+        file_object = serializers.FileField.to_internal_value(self, data)
+        try:
+            image = Image.open(file_object)
+        except Exception:
+            self.fail("invalid_image")
+        if image.format is None:
+            self.fail("invalid_image")
+        file_object.seek(0)
+        return file_object
+
+    def decode(self, imgstr):
+        """
+        Декодирование base64 частями во временный файл с проверкой
+        размера до декодирования. Пробелы и переводы строк, допустимые
+        в base64, отбрасываются внутри каждой части, а остаток части
+        короче четырёх символов переносится в следующую.
+        """
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(imgstr) // 4 * 3 > max_size:
+            self.fail("max_size", max_size=max_size)
+        file = tempfile.SpooledTemporaryFile(max_size=BASE64_CHUNK_SIZE * 16)
+        rest = ""
+        try:
+            for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+                chunk = rest + "".join(
+                    imgstr[start:start + BASE64_CHUNK_SIZE].split()
+                )
+                end = len(chunk) // 4 * 4
+                file.write(base64.b64decode(chunk[:end], validate=True))
+                rest = chunk[end:]
+            if rest:
+                # Длина base64 без пробелов не кратна четырём.
+                raise binascii.Error
+        except binascii.Error:
+            file.close()
+            self.fail("invalid_image")
+        file.seek(0)
+        return file
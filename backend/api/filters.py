@@ -1,7 +1,54 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
+from django_filters import fields
 from django_filters import rest_framework as filter
 from rest_framework import filters
 
-from recipes.models import Recipe
+from api.cache import get_version
+from recipes.models import Recipe, Tag, TagInRecipe
+from recipes.search import SEARCH_CONFIG
+
+
+def get_tag_ids(required=()):
+    """
+    Словарь slug -> id тегов. Хранится в кэше под ключом с версией
+    тегов, поэтому обновляется при их изменении. Если в словаре нет
+    какого-то из slug required, он перечитывается из базы: тег могли
+    создать в другом процессе, версия которого не видна в этом.
+    """
+    key = f"api:tag_ids:{get_version(Tag)}"
+    tag_ids = cache.get(key)
+    if tag_ids is None or not tag_ids.keys() >= set(required):
+        tag_ids = dict(Tag.objects.values_list("slug", "id"))
+        cache.set(key, tag_ids, settings.API_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in sorted(get_tag_ids())]
+
+
+class TagSlugsField(fields.MultipleChoiceField):
+    """Slug тегов: словарь тегов перечитывается до отказа в slug."""
+
+    def valid_value(self, value):
+        return value in get_tag_ids(required=[value])
+
+
+class TagsFilter(filter.MultipleChoiceFilter):
+    field_class = TagSlugsField
 
 
 class CustomSearchFilter(filters.SearchFilter):
@@ -11,6 +58,27 @@ class CustomSearchFilter(filters.SearchFilter):
 
     search_param = "name"
 
+    def filter_queryset(self, request, queryset, view):
+        """
+        Поиск по вхождению в название: сначала ингредиенты,
+        название которых начинается с запроса, не больше
+        INGREDIENT_SEARCH_LIMIT, как и в индексе в памяти.
+        """
+        name = request.query_params.get(self.search_param)
+        if not name:
+            return queryset
+        return (
+            queryset.filter(name__icontains=name)
+            .annotate(
+                is_prefix=Case(
+                    When(name__istartswith=name, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by("is_prefix", "name")[: settings.INGREDIENT_SEARCH_LIMIT]
+        )
+
 
 class RecipeFilter(filter.FilterSet):
     """
@@ -18,9 +86,13 @@ class RecipeFilter(filter.FilterSet):
     """
 
     author = filter.NumberFilter(field_name="author__id")
-    tags = filter.AllValuesMultipleFilter(field_name="tags__slug")
+    tags = TagsFilter(choices=tag_choices, method="filter_tags")
     is_favorited = filter.BooleanFilter(method="is_favorite")
     is_in_shopping_cart = filter.BooleanFilter(method="shopping_cart")
+    search = filter.CharFilter(method="filter_search")
+
+    # Порядок рецептов при поиске, в том числе для пагинации по курсору.
+    search_ordering = ("-rank", "-id")
 
     class Meta:
         model = Recipe
@@ -29,8 +101,49 @@ class RecipeFilter(filter.FilterSet):
             "tags",
             "is_favorited",
             "is_in_shopping_cart",
+            "search",
         ]
 
+    def filter_tags(self, queryset, name, value):
+        """
+        Фильтр по slug тегов: подзапрос EXISTS не размножает рецепты
+        с несколькими подходящими тегами и не требует DISTINCT. Теги,
+        удалённые после проверки значения, пропускаются.
+        """
+        tag_ids = get_tag_ids()
+        return queryset.filter(
+            Exists(
+                TagInRecipe.objects.filter(
+                    recipe=OuterRef("pk"),
+                    tag_id__in=[
+                        tag_ids[slug] for slug in value if slug in tag_ids
+                    ],
+                )
+            )
+        )
+
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию, описанию и ингредиентам
+        по индексу GIN: сначала рецепты с наибольшим ts_rank.
+
+        ts_rank возвращает real, который драйвер читает с округлением;
+        приведение к double precision нужно для точного сравнения
+        с курсором.
+        """
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type="websearch"
+        )
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(
+                rank=Cast(
+                    SearchRank(F("search_vector"), query), FloatField()
+                )
+            )
+            .order_by(*self.search_ordering)
+        )
+
     def is_favorite(self, queryset, name, value):
         """
         Фильтр для избранных рецептов.
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+METRICS = (
+    ("requests_total", "counter", "Number of requests."),
+    ("request_seconds_sum", "counter", "Total request time."),
+    ("db_queries_total", "counter", "Number of SQL queries."),
+    ("db_seconds_sum", "counter", "Time spent in SQL queries."),
+    ("serialize_seconds_sum", "counter", "View time outside SQL queries."),
+    ("render_seconds_sum", "counter", "Response rendering time."),
+    ("response_bytes_sum", "counter", "Response body size."),
+    ("db_queries_max", "gauge", "Largest number of SQL queries."),
+)
+
+
+class EndpointStats:
+    """Накопленные метрики по именам представлений в пределах процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(
+            lambda: dict.fromkeys((name for name, *_ in METRICS), 0)
+        )
+
+    def record(self, view_name, **values):
+        with self._lock:
+            stats = self._stats[view_name]
+            stats["requests_total"] += 1
+            stats["db_queries_max"] = max(
+                stats["db_queries_max"], values["db_queries_total"]
+            )
+            for name, value in values.items():
+                stats[name] += value
+
+    def prometheus(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self._lock:
+            stats = {
+                view: dict(values) for view, values in self._stats.items()
+            }
+        lines = []
+        for name, kind, description in METRICS:
+            lines.append(f"# HELP foodgram_{name} {description}")
+            lines.append(f"# TYPE foodgram_{name} {kind}")
+            for view, values in sorted(stats.items()):
+                lines.append(
+                    f'foodgram_{name}{{view="{view}"}} {values[name]:g}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+endpoint_stats = EndpointStats()
+
+
+class QueryTimer:
+    """Обёртка выполнения SQL, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class QueryMetricsMiddleware:
+    """
+    Замер числа SQL-запросов, времени базы данных, сериализации
+    и размера ответа для каждого представления.
+
+    Результат отдаётся в заголовке Server-Timing и накапливается
+    для /api/_metrics/. При превышении API_QUERY_BUDGET пишется
+    предупреждение в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = request._metrics_timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        end = time.perf_counter()
+        match = request.resolver_match
+        if match is None:
+            return response
+        view_start, view_db_start = getattr(
+            request, "_metrics_view_start", (start, 0.0)
+        )
+        view_end, view_db_end = getattr(
+            request, "_metrics_view_end", (end, timer.duration)
+        )
+        serialize = max(
+            view_end - view_start - (view_db_end - view_db_start), 0.0
+        )
+        render = end - view_end
+        total = end - start
+        size = 0 if response.streaming else len(response.content)
+        endpoint_stats.record(
+            match.view_name,
+            request_seconds_sum=total,
+            db_queries_total=timer.count,
+            db_seconds_sum=timer.duration,
+            serialize_seconds_sum=serialize,
+            render_seconds_sum=render,
+            response_bytes_sum=size,
+        )
+        response["Server-Timing"] = ", ".join(
+            (
+                f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} '
+                f'queries"',
+                f"serialize;dur={serialize * 1000:.1f}",
+                f"render;dur={render * 1000:.1f}",
+                f"total;dur={total * 1000:.1f}",
+            )
+        )
+        if timer.count > settings.API_QUERY_BUDGET:
+            logger.warning(
+                "%s %s ran %d SQL queries (budget %d).",
+                request.method,
+                match.view_name,
+                timer.count,
+                settings.API_QUERY_BUDGET,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view_start = (
+            time.perf_counter(),
+            request._metrics_timer.duration,
+        )
+
+    def process_template_response(self, request, response):
+        request._metrics_view_end = (
+            time.perf_counter(),
+            request._metrics_timer.duration,
+        )
+        return response
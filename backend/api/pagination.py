@@ -1,9 +1,197 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from api.async_views import aevaluate
 
 
 class CustomPagination(PageNumberPagination):
-    """Класс для кастомной пагинации."""
+    """
+    Класс для кастомной пагинации.
+
+    При наличии параметра cursor (в том числе пустого) включается
+    пагинация по ключу: следующая страница выбирается условием
+    по полям view.cursor_ordering без OFFSET и без COUNT(*).
+    Для представлений с keyset_only = True она используется всегда.
+    """
 
     limit = 6
     page_size_query_param = "limit"
     max_page_size = 1000
+    cursor_query_param = "cursor"
+    cursor_ordering = ("-id",)
+    invalid_cursor_message = "Неверный курсор."
+
+    def use_keyset(self, request, view):
+        return self.cursor_query_param in request.query_params or getattr(
+            view, "keyset_only", False
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.use_keyset(request, view)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        queryset = self.keyset_queryset(queryset, request, view)
+        return self.keyset_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Асинхронный вариант paginate_queryset."""
+        self.keyset = self.use_keyset(request, view)
+        if self.keyset:
+            queryset = self.keyset_queryset(queryset, request, view)
+            return self.keyset_page(await aevaluate(queryset))
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        self.page.object_list = await aevaluate(self.page.object_list)
+        self.request = request
+        return self.page.object_list
+
+    def keyset_start(self, queryset, request, view):
+        """
+        Разбор курсора запроса: возвращает размер страницы, значения
+        полей view.cursor_ordering последней строки и признак обратного
+        направления. Страница собирается keyset_page.
+        """
+        self.request = request
+        self.ordering = getattr(view, "cursor_ordering", self.cursor_ordering)
+        descending = {name.startswith("-") for name in self.ordering}
+        assert len(descending) == 1, "cursor_ordering must share direction."
+        self.descending = descending.pop()
+        self.fields = [name.lstrip("-") for name in self.ordering]
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(queryset)
+        self.keyset = True
+        self.keyset_state = (page_size, reverse, values)
+        return page_size, values, reverse
+
+    def keyset_queryset(self, queryset, request, view):
+        """Запрос страницы по курсору с одной лишней строкой."""
+        page_size, values, reverse = self.keyset_start(
+            queryset, request, view
+        )
+        ordering = self.ordering
+        if reverse:
+            ordering = [self.invert(name) for name in ordering]
+        if values is not None:
+            queryset = queryset.filter(
+                self.keyset_condition(values, self.descending != reverse)
+            )
+        return queryset.order_by(*ordering)[: page_size + 1]
+
+    def keyset_page(self, results):
+        """Страница из результатов запроса keyset_queryset."""
+        page_size, reverse, values = self.keyset_state
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = bool(results), has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        if not results:
+            self.has_next = self.has_previous = False
+        self.results = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "count": None,
+                "next": self.get_cursor_link(self.results[-1], False)
+                if self.has_next
+                else None,
+                "previous": self.get_cursor_link(self.results[0], True)
+                if self.has_previous
+                else None,
+                "results": data,
+            }
+        )
+
+    @staticmethod
+    def invert(name):
+        return name[1:] if name.startswith("-") else f"-{name}"
+
+    def keyset_condition(self, values, descending):
+        """
+        Условие (f1, f2, ...) < (v1, v2, ...) или > для возрастания.
+
+        Ведущее условие f1 <= v1 (f1 >= v1) дублирует первое поле
+        вне OR: по нему PostgreSQL начинает просмотр индекса с ключа
+        курсора, а не отфильтровывает все предыдущие строки.
+        """
+        lookup = "lt" if descending else "gt"
+        conditions = []
+        for index, field in enumerate(self.fields):
+            equal = dict(zip(self.fields[:index], values[:index]))
+            conditions.append(
+                Q(**equal, **{f"{field}__{lookup}": values[index]})
+            )
+        condition = reduce(lambda left, right: left | right, conditions)
+        if len(self.fields) > 1:
+            condition &= Q(**{f"{self.fields[0]}__{lookup}e": values[0]})
+        return condition
+
+    def encode_cursor(self, obj, reverse):
+        values = [getattr(obj, field) for field in self.fields]
+        data = json.dumps(
+            {"v": values, "r": reverse}, default=self.encode_value
+        )
+        return urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def encode_value(value):
+        """Значение поля для курсора без потери точности дат."""
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value)
+
+    @staticmethod
+    def output_field(queryset, name):
+        """Поле модели или аннотации запроса для значения курсора."""
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, queryset):
+        encoded = self.request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode()))
+            values = [
+                self.output_field(queryset, field).to_python(value)
+                for field, value in zip(self.fields, data["v"], strict=True)
+            ]
+            return values, bool(data["r"])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_link(self, obj, reverse):
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(obj, reverse),
+        )
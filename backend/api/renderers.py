@@ -0,0 +1,103 @@
+import csv
+import json
+
+import orjson
+from rest_framework import renderers
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListTextRenderer(renderers.BaseRenderer):
+    """Список покупок в текстовом формате."""
+
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, dict):
+            data = "\n".join(f"{key}: {value}" for key, value in data.items())
+        return str(data).encode(self.charset)
+
+    def stream(self, ingredients):
+        """Построчная выдача списка покупок."""
+        yield "Корзина:\n"
+        for ingredient in ingredients:
+            yield "{} ({}) - {}\n".format(*ingredient)
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, ingredients):
+        """Построчная выдача списка покупок."""
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ("Ингредиент", "Единица измерения", "Количество")
+        )
+        for ingredient in ingredients:
+            yield writer.writerow(ingredient)
+
+
+class ShoppingListJSONRenderer(renderers.JSONRenderer):
+    """Список покупок в формате JSON."""
+
+    def stream(self, ingredients):
+        """Поэлементная выдача списка покупок."""
+        separator = "["
+        for name, measurement_unit, amount in ingredients:
+            yield separator + json.dumps(
+                {
+                    "name": name,
+                    "measurement_unit": measurement_unit,
+                    "amount": amount,
+                },
+                ensure_ascii=False,
+            )
+            separator = ","
+        yield "[]" if separator == "[" else "]"
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    JSON через orjson.
+
+    Вывод совпадает побайтно с JSONRenderer при настройках
+    по умолчанию: компактный, без экранирования не-ASCII символов,
+    с экранированием U+2028 и U+2029, даты и Decimal преобразует
+    кодировщик DRF. Отличаются только числа с плавающей точкой
+    меньше 1e-4 или не меньше 1e16 (1e-5 вместо 1e-05), в ответах API
+    таких нет. Вывод с отступами, ensure_ascii и значения, которые
+    orjson не поддерживает, рендерит JSONRenderer.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is None and self.compact and not self.ensure_ascii:
+            try:
+                content = orjson.dumps(
+                    data,
+                    default=self.encoder_class().default,
+                    option=self.options,
+                )
+            except orjson.JSONEncodeError:
+                pass
+            else:
+                return content.replace(
+                    "\u2028".encode(), b"\\u2028"
+                ).replace("\u2029".encode(), b"\\u2029")
+        return super().render(data, accepted_media_type, renderer_context)
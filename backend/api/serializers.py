@@ -1,8 +1,14 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
 from django.forms import ValidationError
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
 from api.fields import Base64ImageField
+from recipes.cookable import cookable_index
+from recipes.images import IMAGE_FORMATS, variant_name
 from recipes.models import (
     Basket,
     Favorite,
@@ -10,8 +16,10 @@ from recipes.models import (
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    ShoppingListItem,
     Tag,
 )
+from recipes.shopping_lists import change_recipe
 from users.models import CustomUser as User
 
 
@@ -33,6 +41,8 @@ class CustomUserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Метод получение статуса подписки на пользователя."""
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         request = self.context.get("request")
         user = request.user
         return (
@@ -40,6 +50,16 @@ class CustomUserSerializer(serializers.ModelSerializer):
             and Follow.objects.filter(user=user.id, following=obj.id).exists()
         )
 
+    def to_representation(self, user):
+        return {
+            "email": user.email,
+            "id": user.id,
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "is_subscribed": self.get_is_subscribed(user),
+        }
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сереализатор тегов."""
@@ -48,6 +68,14 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
         fields = ("id", "name", "color", "slug")
 
+    def to_representation(self, tag):
+        return {
+            "id": tag.id,
+            "name": tag.name,
+            "color": tag.color,
+            "slug": tag.slug,
+        }
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     """Сереализатор ингредиентов."""
@@ -80,15 +108,32 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
             "amount",
         )
 
+    def to_representation(self, recipe_ingredient):
+        ingredient = recipe_ingredient.ingredient
+        return {
+            "id": ingredient.id,
+            "name": ingredient.name,
+            "measurement_unit": ingredient.measurement_unit,
+            "amount": recipe_ingredient.amount,
+        }
+
 
 class RecipeGetSerializer(serializers.ModelSerializer):
-    """Сереализатор списка рецептов."""
+    """
+    Сереализатор списка рецептов.
+
+    Только для чтения: словарь ответа собирается напрямую из рецепта
+    с предзагруженными связями, без обхода полей и get_attribute
+    для каждого значения. Поля объявлены для схемы API, и порядок
+    ключей совпадает с Meta.fields.
+    """
 
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientRecipeSerializer(source="recipe_in", many=True)
     tags = TagSerializer(many=True)
     is_in_shopping_cart = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -101,22 +146,113 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
         )
 
     def get_is_in_shopping_cart(self, obj):
         """Проверка - находится ли рецепт в списке покупок."""
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         request = self.context.get("request")
         user = request.user
         return Basket.objects.filter(user=user.id, recipe=obj.id).exists()
 
     def get_is_favorited(self, obj):
         """Проверка - находится ли рецепт в избранном."""
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         request = self.context.get("request")
         user = request.user
         return Favorite.objects.filter(user=user.id, recipe=obj.id).exists()
 
+    def get_image_variants(self, obj):
+        """
+        Адреса уменьшенных копий изображения по ширине и формату.
+        Пусто, пока копии не созданы.
+        """
+        if obj.image_width is None:
+            return {}
+        request = self.context.get("request")
+        variants = {}
+        for width in settings.RECIPE_IMAGE_WIDTHS:
+            if width >= obj.image_width:
+                continue
+            variants[str(width)] = {}
+            for ext in IMAGE_FORMATS:
+                url = default_storage.url(
+                    variant_name(obj.image.name, width, ext)
+                )
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[str(width)][ext] = url
+        return variants
+
+    def to_representation(self, recipe):
+        fields = self.fields
+        tag = fields["tags"].child
+        ingredient = fields["ingredients"].child
+        return {
+            "id": recipe.id,
+            "tags": [
+                tag.to_representation(item) for item in recipe.tags.all()
+            ],
+            "author": fields["author"].to_representation(recipe.author),
+            "ingredients": [
+                ingredient.to_representation(item)
+                for item in recipe.recipe_in.all()
+            ],
+            "is_favorited": self.get_is_favorited(recipe),
+            "is_in_shopping_cart": self.get_is_in_shopping_cart(recipe),
+            "name": recipe.name,
+            "image": fields["image"].to_representation(recipe.image),
+            "image_variants": self.get_image_variants(recipe),
+            "text": recipe.text,
+            "cooking_time": recipe.cooking_time,
+        }
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся продуктам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=6)
+
+
+class IdsSerializer(serializers.Serializer):
+    """Список id объектов для пакетного добавления или удаления."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+
+class CookableRecipeSerializer(RecipeGetSerializer):
+    """
+    Сереализатор рецепта, подобранного по продуктам: coverage — доля
+    ингредиентов рецепта, которые есть у пользователя, missing —
+    число недостающих ингредиентов.
+    """
+
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeGetSerializer.Meta):
+        fields = RecipeGetSerializer.Meta.fields + ("coverage", "missing")
+
+    def to_representation(self, recipe):
+        data = super().to_representation(recipe)
+        data["coverage"] = recipe.coverage
+        data["missing"] = recipe.missing
+        return data
+
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Сереализатор создания, удаления, редактирования рецепта."""
@@ -167,6 +303,14 @@ class RecipeSerializer(serializers.ModelSerializer):
             if id in ingredients_list:
                 raise ValidationError(f"Ингредиент id={id} уже есть в списке.")
             ingredients_list.append(id)
+        existing = set(
+            Ingredient.objects.filter(id__in=ingredients_list).values_list(
+                "id", flat=True
+            )
+        )
+        missing = [id for id in ingredients_list if id not in existing]
+        if missing:
+            raise ValidationError(f"Ингредиенты id={missing} не найдены.")
         return data
 
     def ingredients_recipe(self, recipe, ingredients):
@@ -185,8 +329,56 @@ class RecipeSerializer(serializers.ModelSerializer):
                 )
             )
         IngredientInRecipe.objects.bulk_create(ingredient_obj)
+        transaction.on_commit(
+            partial(
+                cookable_index.change_recipe,
+                recipe.id,
+                added=[obj.ingredient_id for obj in ingredient_obj],
+            )
+        )
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Вспомогательный метод для изменения ингредиентов рецепта:
+        добавляет новые, удаляет убранные и обновляет изменённые
+        количества, не трогая остальные строки. Разница количеств
+        переносится в списки покупок.
+        """
+        amounts = {
+            ingredient["ingredient"]["id"]: ingredient["amount"]
+            for ingredient in ingredients
+        }
+        deltas = dict(amounts)
+        removed = []
+        removed_ingredients = []
+        changed = []
+        for row in recipe.recipe_in.all():
+            amount = amounts.pop(row.ingredient_id, None)
+            deltas[row.ingredient_id] = (amount or 0) - row.amount
+            if amount is None:
+                removed.append(row.id)
+                removed_ingredients.append(row.ingredient_id)
+            elif amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        IngredientInRecipe.objects.filter(id__in=removed).delete()
+        IngredientInRecipe.objects.bulk_update(changed, ["amount"])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(ingredient_id=id, recipe=recipe, amount=amount)
+            for id, amount in amounts.items()
+        )
+        change_recipe(recipe.id, deltas)
+        transaction.on_commit(
+            partial(
+                cookable_index.change_recipe,
+                recipe.id,
+                removed_ingredients,
+                list(amounts),
+            )
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
         ingredients = validated_data.pop("recipes")
@@ -195,64 +387,69 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
         return self.ingredients_recipe(recipe, ingredients)
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         """Редактирование рецепта."""
-        ingredients = validated_data.pop("recipes")
-        tags = validated_data.pop("tags")
+        ingredients = validated_data.pop("recipes", None)
+        tags = validated_data.pop("tags", None)
         if tags:
-            recipe.tags.clear()
             recipe.tags.set(tags)
         if ingredients:
-            recipe.ingredients.clear()
-            self.ingredients_recipe(recipe, ingredients)
-        super().update(instance=self.instance, validated_data=validated_data)
-        return recipe
+            self.update_ingredients(recipe, ingredients)
+        return super().update(recipe, validated_data)
 
     def to_representation(self, instance):
-        serializer = RecipeGetSerializer(
-            instance, context={"request": self.context.get("request")}
+        request = self.context.get("request")
+        instance = Recipe.objects.with_related(request.user).get(
+            pk=instance.pk
         )
-        return serializer.data
+        return RecipeGetSerializer(
+            instance, context={"request": request}
+        ).data
 
 
-class ShoppincartSerializer(serializers.ModelSerializer):
-    """Сереализатор добавления рецепта в карзину."""
+class ShortRecipeSerializer(serializers.ModelSerializer):
+    """
+    Сереализатор краткой информации о рецепте для ответов
+    на добавление в избранное и список покупок. Ответ собирается
+    из уже прочитанных полей рецепта, изображение выводится ссылкой
+    без обращения к файлу.
+    """
 
-    name = serializers.CharField(source="recipe.name")
-    image = Base64ImageField(source="recipe.image")
-    cooking_time = serializers.IntegerField(source="recipe.cooking_time")
+    image = serializers.ImageField(read_only=True)
 
     class Meta:
-        model = Basket
-        fields = ("id", "name", "image", "cooking_time", "recipe", "user")
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Basket.objects.all(), fields=("user", "recipe")
-            )
-        ]
+        model = Recipe
+        fields = ("id", "name", "image", "cooking_time")
+
+    def to_representation(self, recipe):
+        return {
+            "id": recipe.id,
+            "name": recipe.name,
+            "image": self.fields["image"].to_representation(recipe.image),
+            "cooking_time": recipe.cooking_time,
+        }
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сереализатор добавления рецепта в избранное."""
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Сереализатор ингредиента списка покупок."""
 
-    name = serializers.CharField(source="recipe.name")
-    image = Base64ImageField(source="recipe.image")
-    cooking_time = serializers.IntegerField(source="recipe.cooking_time")
+    name = serializers.CharField(source="ingredient.name")
+    measurement_unit = serializers.CharField(
+        source="ingredient.measurement_unit"
+    )
+    amount = serializers.IntegerField(source="total_amount")
 
     class Meta:
-        model = Favorite
-        fields = ("id", "name", "image", "cooking_time", "recipe", "user")
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(), fields=("user", "recipe")
-            )
-        ]
+        model = ShoppingListItem
+        fields = ("name", "measurement_unit", "amount")
 
 
 class RecipeFollowSerializer(serializers.ModelSerializer):
     """
     Сереализатор для отображения рецептов авторов
-    на которых подписан пользователь.
+    на которых подписан пользователь. Ответ собирается
+    так же, как в RecipeGetSerializer.
     """
 
     ingredients = IngredientRecipeSerializer(
@@ -279,6 +476,25 @@ class RecipeFollowSerializer(serializers.ModelSerializer):
             "cooking_time",
         )
 
+    def to_representation(self, recipe):
+        fields = self.fields
+        tag = fields["tags"].child
+        ingredient = fields["ingredients"].child
+        return {
+            "id": recipe.id,
+            "tags": [
+                tag.to_representation(item) for item in recipe.tags.all()
+            ],
+            "ingredients": [
+                ingredient.to_representation(item)
+                for item in recipe.recipe_in.all()
+            ],
+            "name": recipe.name,
+            "image": fields["image"].to_representation(recipe.image),
+            "text": recipe.text,
+            "cooking_time": recipe.cooking_time,
+        }
+
 
 class AuthorGetSerializer(serializers.ModelSerializer):
     """Сереализатор Подписок. для GET запроса."""
@@ -300,6 +516,8 @@ class AuthorGetSerializer(serializers.ModelSerializer):
 
     def get_recipes(self, obj):
         """Метод получение рецепта."""
+        if hasattr(obj, "latest_recipes"):
+            return RecipeFollowSerializer(obj.latest_recipes, many=True).data
         request = self.context.get("request")
         recipes_limit = request.GET.get("recipes_limit")
         recipe = obj.recipes.all()
@@ -307,25 +525,13 @@ class AuthorGetSerializer(serializers.ModelSerializer):
             recipe = recipe[: int(recipes_limit)]
         return RecipeFollowSerializer(recipe, many=True).data
 
-
-class FollowSerializer(serializers.ModelSerializer):
-    """Сереализатор добавления подписки."""
-
-    class Meta:
-        model = Follow
-        fields = (
-            "id",
-            "user",
-            "following",
-        )
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(), fields=("user", "following")
-            )
-        ]
-
-    def validate_following(self, value):
-        """Проверка подписчика."""
-        if value.id == self.initial_data["user"]:
-            raise serializers.ValidationError("Нельзя подписаться на себя.")
-        return value
+    def to_representation(self, author):
+        return {
+            "email": author.email,
+            "id": author.id,
+            "username": author.username,
+            "first_name": author.first_name,
+            "last_name": author.last_name,
+            "recipes": self.get_recipes(author),
+            "recipes_count": author.recipes_count,
+        }
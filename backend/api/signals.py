@@ -0,0 +1,38 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.cache import bump_version
+from recipes.models import Ingredient, Tag
+from users.models import CustomUser as User
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_cached_responses(sender, **kwargs):
+    """Сброс кэша ответов при изменении тегов и ингредиентов."""
+    bump_version(sender)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(instance, **kwargs):
+    """Сброс снимка удалённого токена, в том числе при выходе."""
+    transaction.on_commit(partial(token_cache.delete, [instance.key]))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, **kwargs):
+    """
+    Сброс снимков токенов пользователя при его изменении: смене
+    пароля, деактивации, редактировании профиля.
+    """
+    if not created:
+        keys = list(
+            Token.objects.filter(user=instance).values_list("key", flat=True)
+        )
+        if keys:
+            transaction.on_commit(partial(token_cache.delete, keys))
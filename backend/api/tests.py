@@ -0,0 +1,414 @@
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from rest_framework.test import APITestCase
+
+from recipes.models import (
+    Basket,
+    Favorite,
+    Follow,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingListItem,
+    Tag,
+)
+from recipes.shopping_lists import rebuild
+from users.models import CustomUser as User
+
+
+def ingredient_amounts(recipe):
+    return dict(recipe.recipe_in.values_list("ingredient_id", "amount"))
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        password="Test-pass-123",
+        first_name="Имя",
+        last_name="Фамилия",
+    )
+
+
+def create_recipes(author, count, tags, ingredients):
+    """Рецепты автора со всеми тегами и ингредиентами."""
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f"Рецепт {author.username} {number}",
+            image="data/images/test.png",
+            text="Описание",
+            cooking_time=10,
+        )
+        recipe.tags.set(tags)
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=5)
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+class RecipeDataTestCase(APITestCase):
+    """Общие данные: теги и ингредиенты рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(
+                name=f"Тег {number}",
+                color="#000000",
+                slug=f"tag-{number}",
+            )
+            for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f"Ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(3)
+        ]
+
+
+class RecipeListQueriesTest(RecipeDataTestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = create_user("author")
+        cls.reader = create_user("reader")
+        recipes = create_recipes(cls.author, 12, cls.tags, cls.ingredients)
+        Follow.objects.create(user=cls.reader, following=cls.author)
+        for recipe in recipes[::2]:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+            Basket.objects.create(user=cls.reader, recipe=recipe)
+
+    def assert_list_queries(self, queries):
+        # Первый запрос загружает справочник тегов фильтра в память.
+        self.client.get("/api/recipes/")
+        for limit in (1, 6, 12):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(
+                        "/api/recipes/", {"limit": limit}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data["results"]), limit)
+
+    def test_anonymous(self):
+        self.assert_list_queries(5)
+
+    def test_authenticated(self):
+        self.client.force_authenticate(user=self.reader)
+        self.assert_list_queries(5)
+
+
+class SubscriptionsQueriesTest(RecipeDataTestCase):
+    """
+    Число запросов списка подписок не зависит от recipes_limit
+    и количества авторов на странице.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        authors = [create_user(f"author{number}") for number in range(6)]
+        for author in authors:
+            create_recipes(author, 4, cls.tags, cls.ingredients)
+        cls.readers = {}
+        for count in (1, 3, 6):
+            reader = create_user(f"reader{count}")
+            Follow.objects.bulk_create(
+                Follow(user=reader, following=author)
+                for author in authors[:count]
+            )
+            cls.readers[count] = reader
+
+    def test_subscriptions(self):
+        for count, reader in self.readers.items():
+            self.client.force_authenticate(user=reader)
+            for recipes_limit in ("1", "3", None):
+                params = {"limit": 6}
+                if recipes_limit is not None:
+                    params["recipes_limit"] = recipes_limit
+                with self.subTest(authors=count, recipes_limit=recipes_limit):
+                    with self.assertNumQueries(5):
+                        response = self.client.get(
+                            "/api/users/subscriptions/", params
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    results = response.data["results"]
+                    self.assertEqual(len(results), count)
+                    self.assertEqual(
+                        {len(author["recipes"]) for author in results},
+                        {int(recipes_limit or 4)},
+                    )
+
+
+class RecipeIngredientsUpdateTest(RecipeDataTestCase):
+    """Изменение ингредиентов рецепта затрагивает только отличия."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = create_user("author")
+        cls.extra = Ingredient.objects.create(
+            name="Ингредиент 3", measurement_unit="шт"
+        )
+
+    def setUp(self):
+        (self.recipe,) = create_recipes(
+            self.author, 1, self.tags, self.ingredients
+        )
+        self.client.force_authenticate(user=self.author)
+
+    def patch_ingredients(self, ingredients):
+        return self.client.patch(
+            f"/api/recipes/{self.recipe.id}/",
+            {
+                "ingredients": [
+                    {"id": id, "amount": amount}
+                    for id, amount in ingredients.items()
+                ]
+            },
+            format="json",
+        )
+
+    def test_diff(self):
+        kept, changed, removed = self.ingredients
+        rows = dict(self.recipe.recipe_in.values_list("ingredient_id", "id"))
+        response = self.patch_ingredients(
+            {kept.id: 5, changed.id: 8, self.extra.id: 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            ingredient_amounts(self.recipe),
+            {kept.id: 5, changed.id: 8, self.extra.id: 2},
+        )
+        new_rows = dict(
+            self.recipe.recipe_in.values_list("ingredient_id", "id")
+        )
+        self.assertEqual(new_rows[kept.id], rows[kept.id])
+        self.assertEqual(new_rows[changed.id], rows[changed.id])
+        self.assertNotIn(removed.id, new_rows)
+
+    def test_invalid_ingredients_keep_recipe(self):
+        before = ingredient_amounts(self.recipe)
+        missing = Ingredient.objects.order_by("-id").first().id + 1
+        for ingredients in (
+            {self.extra.id: 2, missing: 1},
+            {self.extra.id: 0},
+        ):
+            with self.subTest(ingredients=ingredients):
+                response = self.patch_ingredients(ingredients)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(ingredient_amounts(self.recipe), before)
+
+
+class ShoppingListDeltaTest(RecipeDataTestCase):
+    """Списки покупок следуют за изменением рецептов в корзинах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = create_user("author")
+        cls.reader = create_user("reader")
+        cls.other = create_user("other")
+        cls.extra = Ingredient.objects.create(
+            name="Ингредиент 3", measurement_unit="шт"
+        )
+        cls.edited, cls.kept = create_recipes(
+            cls.author, 2, cls.tags, cls.ingredients
+        )
+        Basket.objects.create(user=cls.reader, recipe=cls.edited)
+        Basket.objects.create(user=cls.reader, recipe=cls.kept)
+        Basket.objects.create(user=cls.other, recipe=cls.kept)
+
+    def shopping_list(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get("/api/recipes/shopping_list/")
+        self.assertEqual(response.status_code, 200)
+        return {item["name"]: item["amount"] for item in response.data}
+
+    def assert_consistent(self):
+        self.assertEqual(
+            rebuild(ShoppingListItem, Basket, IngredientInRecipe, fix=False),
+            0,
+        )
+
+    def test_recipe_edit(self):
+        first, second, third = self.ingredients
+        self.client.force_authenticate(user=self.author)
+        response = self.client.patch(
+            f"/api/recipes/{self.edited.id}/",
+            {
+                "ingredients": [
+                    {"id": first.id, "amount": 5},
+                    {"id": second.id, "amount": 8},
+                    {"id": self.extra.id, "amount": 2},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.shopping_list(self.reader),
+            {
+                first.name: 10,
+                second.name: 13,
+                third.name: 5,
+                self.extra.name: 2,
+            },
+        )
+        self.assertEqual(
+            self.shopping_list(self.other),
+            {first.name: 5, second.name: 5, third.name: 5},
+        )
+        self.assert_consistent()
+
+    def test_cart_remove_and_recipe_delete(self):
+        first, second, third = self.ingredients
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.delete(
+            f"/api/recipes/{self.edited.id}/shopping_cart/"
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            self.shopping_list(self.reader),
+            {first.name: 5, second.name: 5, third.name: 5},
+        )
+        self.client.force_authenticate(user=self.author)
+        response = self.client.delete(f"/api/recipes/{self.kept.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.shopping_list(self.reader), {})
+        self.assertEqual(self.shopping_list(self.other), {})
+        self.assert_consistent()
+
+
+class BatchLinksTest(RecipeDataTestCase):
+    """Пакетное добавление и удаление избранного, корзины и подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = create_user("author")
+        cls.second_author = create_user("second_author")
+        cls.reader = create_user("reader")
+        cls.recipes = create_recipes(cls.author, 3, cls.tags, cls.ingredients)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.reader)
+
+    def post(self, url, ids):
+        return self.client.post(url, {"ids": ids}, format="json")
+
+    def delete(self, url, ids):
+        return self.client.delete(url, {"ids": ids}, format="json")
+
+    def test_favorites(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        url = "/api/recipes/favorite/"
+        response = self.post(url, [first, second, first])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [recipe["id"] for recipe in response.data], [first, second]
+        )
+        self.assertEqual(
+            set(response.data[0]), {"id", "name", "image", "cooking_time"}
+        )
+        response = self.post(url, [first, second])
+        self.assertEqual(response.status_code, 400)
+        response = self.post(url, [second, third])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([recipe["id"] for recipe in response.data], [third])
+        self.assertEqual(
+            dict(
+                Recipe.objects.filter(author=self.author).values_list(
+                    "id", "favorites_count"
+                )
+            ),
+            {first: 1, second: 1, third: 1},
+        )
+        self.assertEqual(self.delete(url, [first, third]).status_code, 204)
+        self.assertEqual(self.delete(url, [first, third]).status_code, 400)
+        self.assertEqual(
+            list(
+                Favorite.objects.filter(user=self.reader).values_list(
+                    "recipe_id", flat=True
+                )
+            ),
+            [second],
+        )
+        self.assertEqual(Recipe.objects.get(id=first).favorites_count, 0)
+
+    def test_missing_recipe_saves_nothing(self):
+        missing = Recipe.objects.order_by("-id").first().id + 1
+        response = self.post(
+            "/api/recipes/shopping_cart/", [self.recipes[0].id, missing]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Basket.objects.filter(user=self.reader).exists())
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(
+            Recipe.objects.get(id=self.recipes[0].id).baskets_count, 0
+        )
+
+    def test_shopping_cart(self):
+        ids = [recipe.id for recipe in self.recipes[:2]]
+        url = "/api/recipes/shopping_cart/"
+        self.assertEqual(self.post(url, ids).status_code, 201)
+        self.assertEqual(
+            set(
+                ShoppingListItem.objects.filter(user=self.reader).values_list(
+                    "ingredient_id", "total_amount"
+                )
+            ),
+            {(ingredient.id, 10) for ingredient in self.ingredients},
+        )
+        self.assertEqual(self.delete(url, ids).status_code, 204)
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.reader).exists()
+        )
+
+    def test_subscriptions(self):
+        url = "/api/users/subscribe/"
+        authors = [self.author.id, self.second_author.id]
+        response = self.post(url, [*authors, self.reader.id])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        response = self.post(url, authors)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(author["id"] for author in response.data), authors
+        )
+        self.assertEqual(self.post(url, authors).status_code, 400)
+        self.assertEqual(self.delete(url, authors).status_code, 204)
+        self.assertEqual(self.delete(url, authors).status_code, 400)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_single_recipe_does_not_open_image(self):
+        recipe = self.recipes[0]
+        with mock.patch.object(FileSystemStorage, "open") as storage_open:
+            response = self.client.post(f"/api/recipes/{recipe.id}/favorite/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.data,
+            {
+                "id": recipe.id,
+                "name": recipe.name,
+                "image": "http://testserver/media/data/images/test.png",
+                "cooking_time": recipe.cooking_time,
+            },
+        )
+        storage_open.assert_not_called()
+
+    def test_invalid_ids(self):
+        for ids in ([], ["x"], [0], list(range(1, 102))):
+            with self.subTest(ids=ids[:3]):
+                response = self.post("/api/recipes/favorite/", ids)
+                self.assertEqual(response.status_code, 400)
@@ -3,11 +3,13 @@ from django.conf.urls.static import static
 from django.urls import include, path
 from rest_framework import routers
 
+from api.async_views import async_urlpatterns
 from api.views import (
     CustomUserViewSet,
     IngredientsViewSet,
     RecipesViewSet,
     TagsViewSet,
+    metrics,
 )
 
 router = routers.DefaultRouter()
@@ -17,11 +19,13 @@ router.register(r"ingredients", IngredientsViewSet, basename="ingredients")
 router.register(r"users", CustomUserViewSet, basename="users")
 
 urlpatterns = [
-    path(
-        "recipes/download_shopping_cart/",
-        RecipesViewSet.as_view({"get": "download_shopping_cart"}),
-        name="recipes_download_shopping_cart",
-    ),
+    path("_metrics/", metrics, name="metrics"),
+]
+
+if settings.ASYNC_API:
+    urlpatterns += async_urlpatterns(router)
+
+urlpatterns += [
     path("", include(router.urls)),
     path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
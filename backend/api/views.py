@@ -1,5 +1,8 @@
-from django.db.models.aggregates import Count, Sum
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import permissions, status, viewsets
@@ -7,30 +10,94 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from api.async_views import AsyncReadOnlyMixin
+from api.cache import CachedResponseMixin
 from api.filters import CustomSearchFilter, RecipeFilter
+from api.middleware import endpoint_stats
 from api.permissions import AuthorOrReadOnly
+from api.renderers import (
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListTextRenderer,
+)
 from api.serializers import (
     AuthorGetSerializer,
+    CookableQuerySerializer,
+    CookableRecipeSerializer,
     CustomUserSerializer,
-    FavoriteSerializer,
-    FollowSerializer,
+    IdsSerializer,
     IngredientSerializer,
     RecipeGetSerializer,
     RecipeSerializer,
-    ShoppincartSerializer,
+    ShoppingListItemSerializer,
+    ShortRecipeSerializer,
     TagSerializer,
 )
+from recipes import links
+from recipes.autocomplete import ingredient_index
+from recipes.cookable import cookable_index
+from recipes.feed import subscription_feed
 from recipes.models import (
     Basket,
     Favorite,
     Follow,
     Ingredient,
-    IngredientInRecipe,
     Recipe,
+    ShoppingListItem,
     Tag,
 )
 from users.models import CustomUser as User
 
+SHOPPING_LIST_CHUNK_SIZE = 500
+LINK_RECIPE_COLUMNS = ("name", "image", "cooking_time")
+
+
+def link_ids(request, pk=None):
+    """
+    id объектов действия: из адреса для одного объекта или из списка
+    ids в теле пакетного запроса, без повторов.
+    """
+    serializer = IdsSerializer(
+        data=request.data if pk is None else {"ids": [pk]}
+    )
+    serializer.is_valid(raise_exception=True)
+    return list(dict.fromkeys(serializer.validated_data["ids"]))
+
+
+def add_links(model, user_id, ids, columns=()):
+    """
+    Добавление связей пользователя с объектами ids. Если часть
+    объектов не найдена, ничего не сохраняется. Возвращает строки
+    links.add и ответ с ошибкой или None.
+    """
+    with transaction.atomic():
+        rows = links.add(model, user_id, ids, columns)
+        missing = set(ids).difference(row[0] for row in rows)
+        if missing:
+            transaction.set_rollback(True)
+            return rows, Response(
+                {"errors": f"Не найдены объекты с id {sorted(missing)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+    if all(row[1] is None for row in rows):
+        return rows, Response(
+            {"errors": "Все объекты уже добавлены."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return rows, None
+
+
+def remove_links(model, user_id, ids):
+    """
+    Удаление связей пользователя с объектами ids вместе со счётчиками
+    и списком покупок в одной транзакции.
+    """
+    with transaction.atomic():
+        removed = links.remove(model, user_id, ids)
+    if removed:
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(status=status.HTTP_400_BAD_REQUEST)
+
 
 class CustomUserViewSet(UserViewSet):
     """
@@ -40,6 +107,46 @@ class CustomUserViewSet(UserViewSet):
 
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
+    cursor_ordering = ("id",)
+
+    def with_recipes(self, queryset):
+        """
+        Авторы с предзагруженными рецептами: не более recipes_limit
+        последних рецептов каждого автора одним оконным запросом.
+        """
+        recipes = Recipe.objects.with_tags_and_ingredients()
+        recipes_limit = self.request.query_params.get("recipes_limit")
+        if recipes_limit is not None and recipes_limit.isdigit():
+            recipes = recipes[: int(recipes_limit)]
+        return queryset.prefetch_related(
+            Prefetch("recipes", queryset=recipes, to_attr="latest_recipes")
+        )
+
+    def change_subscriptions(self, request, pk=None):
+        """
+        Подписка на авторов и отписка от них одним запросом
+        INSERT ... ON CONFLICT или DELETE.
+        """
+        ids = link_ids(request, pk)
+        user_id = request.user.id
+        if request.method == "DELETE":
+            return remove_links(Follow, user_id, ids)
+        if user_id in ids:
+            return Response(
+                {"errors": "Нельзя подписаться на себя."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        rows, error = add_links(Follow, user_id, ids)
+        if error is not None:
+            return error
+        added = [author_id for author_id, follow_id in rows if follow_id]
+        queryset = self.with_recipes(User.objects.filter(id__in=added))
+        serializer = AuthorGetSerializer(
+            queryset,
+            many=True,
+            context={"request": request},
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(
         detail=True,
@@ -48,32 +155,18 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscribe(self, request, **kwargs):
         """Метод для подписки и отписки пользователя на авторов рецептов."""
-        author_id = self.kwargs.get("id")
-        user_id = self.request.user.id
-        if request.method == "POST":
-            serializer = FollowSerializer(
-                data={
-                    "user": user_id,
-                    "following": author_id,
-                }
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            queryset = User.objects.filter(id=author_id).annotate(
-                recipes_count=Count("recipes")
-            )
-            serializer = AuthorGetSerializer(
-                queryset,
-                many=True,
-                context={"request": request},
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.change_subscriptions(request, self.kwargs.get("id"))
 
-        follow = Follow.objects.filter(user=user_id, following=author_id)
-        if follow:
-            follow.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="subscribe",
+        url_name="subscribe-batch",
+        permission_classes=(IsAuthenticated,),
+    )
+    def subscribe_batch(self, request):
+        """Подписка на авторов из списка ids и отписка от них."""
+        return self.change_subscriptions(request)
 
     @action(
         detail=False,
@@ -82,7 +175,7 @@ class CustomUserViewSet(UserViewSet):
     def subscriptions(self, request):
         """Метод для просмотра авторов на которых подписан пользователь."""
         user = self.request.user.id
-        queryset = User.objects.filter(follow__user=user)
+        queryset = self.with_recipes(User.objects.filter(follow__user=user))
         pages = self.paginate_queryset(queryset)
         serializer = AuthorGetSerializer(
             pages,
@@ -92,75 +185,180 @@ class CustomUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(
+    CachedResponseMixin, AsyncReadOnlyMixin, viewsets.ReadOnlyModelViewSet
+):
     """Вьюсет для работы с тегами."""
 
+    cache_model = Tag
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(
+    CachedResponseMixin, AsyncReadOnlyMixin, viewsets.ReadOnlyModelViewSet
+):
     """Вьюсет для работы с ингредиентами."""
 
+    cache_model = Ingredient
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     filter_backends = (CustomSearchFilter,)
-    search_fields = ["^name"]
 
+    def list(self, request, *args, **kwargs):
+        """Метод поиска ингредиентов по индексу в памяти."""
+        name = request.query_params.get(CustomSearchFilter.search_param)
+        if name:
+            ingredients = ingredient_index.search(name)
+            if ingredients is not None:
+                return Response(ingredients)
+        return super().list(request, *args, **kwargs)
 
-class RecipesViewSet(viewsets.ModelViewSet):
+    async def alist(self, request, *args, **kwargs):
+        name = request.query_params.get(CustomSearchFilter.search_param)
+        if name:
+            ingredients = await sync_to_async(ingredient_index.search)(name)
+            if ingredients is not None:
+                return Response(ingredients)
+        return await super().alist(request, *args, **kwargs)
+
+
+class RecipesViewSet(AsyncReadOnlyMixin, viewsets.ModelViewSet):
     """Вьюсет рецептов."""
 
     queryset = Recipe.objects.all()
     permission_classes = (AuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    cursor_ordering = ("-pub_date", "-id")
+    keyset_only = False
+
+    def get_queryset(self):
+        """Метод получения рецептов с учётом действия."""
+        if self.action in ("list", "retrieve", "popular", "feed", "cookable"):
+            return Recipe.objects.with_related(self.request.user)
+        return super().get_queryset()
+
+    def filter_queryset(self, queryset):
+        """
+        Фильтрация рецептов. При поиске список упорядочен
+        по релевантности, и курсор строится по ней же.
+        """
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list" and "rank" in queryset.query.annotations:
+            self.cursor_ordering = RecipeFilter.search_ordering
+        return queryset
 
     def get_serializer_class(self, *args, **kwargs):
         """Метод определения сереализатора."""
-        if self.request.method == "GET":
+        if self.request.method in permissions.SAFE_METHODS:
             return RecipeGetSerializer
         return RecipeSerializer
 
     def perform_create(self, serializer):
         """Метод сохранения данных сереализатора."""
         serializer.save(author=self.request.user)
-        return super().perform_create(serializer)
-
-    def shopping_or_favorite(
-        self,
-        current_model,
-        current_serializer,
-        request,
-        pk=None,
-    ):
-        """Метод добавления рецептов в корзину,избраное или удаление из них."""
-        user = request.user.id
-        if not Recipe.objects.filter(id=pk).exists():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    def shopping_or_favorite(self, current_model, request, pk=None):
+        """
+        Метод добавления рецептов в корзину, избранное или удаления
+        из них. Ответ строится из полей рецептов, прочитанных тем же
+        запросом, что и добавил связи.
+        """
+        ids = link_ids(request, pk)
+        user_id = request.user.id
         if request.method == "DELETE":
-            basket = current_model.objects.filter(user=user, recipe=pk)
-            if basket.exists():
-                basket.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        recipe = Recipe.objects.get(id=pk)
-        serializer = current_serializer(
-            data={
-                "user": user,
-                "recipe": pk,
-                "name": recipe.name,
-                "image": recipe.image,
-                "cooking_time": recipe.cooking_time,
-            },
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            return remove_links(current_model, user_id, ids)
+        rows, error = add_links(
+            current_model, user_id, ids, LINK_RECIPE_COLUMNS
+        )
+        if error is not None:
+            return error
+        recipes = [
+            Recipe(id=recipe_id, **dict(zip(LINK_RECIPE_COLUMNS, values)))
+            for recipe_id, link_id, *values in rows
+            if link_id is not None
+        ]
+        data = ShortRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        ).data
+        return Response(
+            data if pk is None else data[0], status=status.HTTP_201_CREATED
+        )
+
+    @action(
+        detail=False,
+        cursor_ordering=("-score", "-id"),
+        keyset_only=True,
+    )
+    def popular(self, request):
+        """
+        Популярные рецепты по убыванию популярности, которая
+        периодически пересчитывается командой refresh_popularity.
+        """
+        queryset = self.filter_queryset(
+            self.get_queryset()
+            .filter(popularity__isnull=False)
+            .annotate(score=F("popularity__score"))
+        )
+        serializer = self.get_serializer(
+            self.paginate_queryset(queryset), many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+        keyset_only=True,
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь,
+        от новых к старым с пагинацией по курсору.
+        """
+        queryset = self.get_queryset()
+        page_size, values, reverse = self.paginator.keyset_start(
+            queryset, request, self
+        )
+        keys = subscription_feed(
+            request.user.id, page_size + 1, values, reverse
+        )
+        recipes = queryset.in_bulk([recipe_id for _, recipe_id in keys])
+        page = self.paginator.keyset_page(
+            [recipes[id] for _, id in keys if id in recipes]
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def cookable(self, request):
+        """
+        Подбор рецептов по имеющимся продуктам (?ingredients=<id>, можно
+        несколько): сначала рецепты с наибольшей долей имеющихся
+        ингредиентов, не более limit рецептов.
+        """
+        query = CookableQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        found = cookable_index.search(
+            query.validated_data["ingredients"],
+            query.validated_data["limit"],
+        )
+        recipes = self.get_queryset().in_bulk([id for id, _, _ in found])
+        page = []
+        for recipe_id, matched, total in found:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.coverage = matched / total
+                recipe.missing = total - matched
+                page.append(recipe)
+        serializer = CookableRecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
 
     @action(
         detail=True,
@@ -169,12 +367,18 @@ class RecipesViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk=None):
         """Создан для добавления и удаления рецепта из избранного."""
-        return self.shopping_or_favorite(
-            Favorite,
-            FavoriteSerializer,
-            request,
-            pk=pk,
-        )
+        return self.shopping_or_favorite(Favorite, request, pk=pk)
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="favorite",
+        url_name="favorite-batch",
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def favorite_batch(self, request):
+        """Добавление и удаление рецептов из списка ids в избранном."""
+        return self.shopping_or_favorite(Favorite, request)
 
     @action(
         detail=True,
@@ -183,36 +387,71 @@ class RecipesViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk=None):
         """Создан для добавления и удаления рецепта из списка покупок."""
-        return self.shopping_or_favorite(
-            Basket,
-            ShoppincartSerializer,
-            request,
-            pk=pk,
+        return self.shopping_or_favorite(Basket, request, pk=pk)
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="shopping_cart",
+        url_name="shopping-cart-batch",
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def shopping_cart_batch(self, request):
+        """Добавление и удаление рецептов из списка ids в списке покупок."""
+        return self.shopping_or_favorite(Basket, request)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def shopping_list(self, request):
+        """Список покупок пользователя с итоговыми количествами."""
+        items = (
+            ShoppingListItem.objects.filter(user=request.user)
+            .select_related("ingredient")
+            .order_by("ingredient__name")
         )
+        return Response(ShoppingListItemSerializer(items, many=True).data)
 
     @action(
-        detail=True,
+        detail=False,
         methods=["get"],
         permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+        ),
     )
     def download_shopping_cart(self, request):
         """Создан для скачивания файла со списком покупок."""
-        user = request.user
-        basket = Basket.objects.filter(user=user)
-        if basket.exists():
-            ingredients = (
-                IngredientInRecipe.objects.filter(recipe__baskets__user=user)
-                .values("ingredient__name", "ingredient__measurement_unit")
-                .annotate(total_amount=Sum("amount"))
-                .values_list(
-                    "ingredient__name",
-                    "ingredient__measurement_unit",
-                    "total_amount",
-                )
-            )
-            for ingredient in ingredients:
-                products = ["{} ({}) - {}".format(*ingredient)]
-            return HttpResponse(
-                "Корзина:\n" + "\n".join(products), content_type="text/plain"
-            )
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        items = ShoppingListItem.objects.filter(user=request.user)
+        if not items.exists():
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        ingredients = items.order_by("ingredient__name").values_list(
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            "total_amount",
+        )
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(
+                ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+            ),
+            content_type=f"{renderer.media_type}; charset=utf-8",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
+        )
+        return response
+
+
+def metrics(request):
+    """Метрики запросов к API в формате Prometheus."""
+    if not settings.API_METRICS:
+        raise Http404
+    return HttpResponse(
+        endpoint_stats.prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
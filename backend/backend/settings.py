@@ -36,6 +36,15 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+ASYNC_API = os.getenv("ASYNC_API", default="False") == "True"
+ASYNC_API_DB_CONCURRENCY = int(
+    os.getenv("ASYNC_API_DB_CONCURRENCY", default=10)
+)
+API_METRICS = os.getenv("API_METRICS", default="False") == "True"
+API_QUERY_BUDGET = int(os.getenv("API_QUERY_BUDGET", default=20))
+if API_METRICS:
+    MIDDLEWARE.insert(0, "api.middleware.QueryMetricsMiddleware")
+
 ROOT_URLCONF = "backend.urls"
 
 TEMPLATES = [
@@ -65,9 +74,56 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
         "HOST": os.getenv("DB_HOST", ""),
         "PORT": os.getenv("DB_PORT", 5432),
+        # Под ASGI каждый запрос получает своё соединение в отдельном
+        # потоке, поэтому постоянные соединения там по умолчанию выключены.
+        "CONN_MAX_AGE": int(
+            os.getenv("DB_CONN_MAX_AGE", default=0 if ASYNC_API else 60)
+        ),
+        "CONN_HEALTH_CHECKS": os.getenv(
+            "DB_CONN_HEALTH_CHECKS", default="True"
+        )
+        == "True",
+        # DB_POOL_MODE=transaction — подключение через pgbouncer в режиме
+        # pool_mode=transaction: именованные курсоры живут только внутри
+        # транзакции, поэтому серверные курсоры для iterator() выключаются.
+        "DISABLE_SERVER_SIDE_CURSORS": os.getenv("DB_POOL_MODE", default="")
+        == "transaction",
     }
 }
 
+CACHE_BACKEND = os.getenv(
+    "CACHE_BACKEND",
+    default="django.core.cache.backends.locmem.LocMemCache",
+)
+# LocMemCache живёт в памяти процесса: сброс записей в одном процессе
+# сервера не виден остальным.
+CACHE_IS_SHARED = not CACHE_BACKEND.endswith("LocMemCache")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", default=""),
+    },
+    # Последние рецепты авторов для ленты подписок, по записи на автора.
+    # В памяти процесса это отдельное хранилище со своим MAX_ENTRIES,
+    # и записи не вытесняют ответы API. В общем кэше по тому же адресу
+    # записи отделены только префиксом ключей, а вытеснение общее.
+    "feed": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", default="feed"),
+        "KEY_PREFIX": "feed",
+    },
+}
+if CACHE_BACKEND.endswith("LocMemCache"):
+    CACHES["feed"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("FEED_CACHE_MAX_ENTRIES", default=100000))
+    }
+API_CACHE_TIMEOUT = int(os.getenv("API_CACHE_TIMEOUT", default=300))
+TOKEN_CACHE_TIMEOUT = int(os.getenv("TOKEN_CACHE_TIMEOUT", default=300))
+TOKEN_CACHE_LOCAL_TIMEOUT = int(
+    os.getenv("TOKEN_CACHE_LOCAL_TIMEOUT", default=10)
+)
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", default=10000))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -102,6 +158,12 @@ STATIC_ROOT = BASE_DIR / "collected_static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = "/media/"
 
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv("RECIPE_IMAGE_MAX_SIZE", default=10 * 1024 * 1024)
+)
+RECIPE_IMAGE_WIDTHS = (300, 600, 1200)
+IMAGE_PROCESSING_WORKERS = int(os.getenv("IMAGE_PROCESSING_WORKERS", default=2))
+
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -110,13 +172,31 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
+    ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ],
     "DEFAULT_PAGINATION_CLASS": "api.pagination.CustomPagination",
     "PAGE_SIZE": 6,
 }
 
 
+INGREDIENT_INDEX_MAX_SIZE = int(
+    os.getenv("INGREDIENT_INDEX_MAX_SIZE", default=10000)
+)
+INGREDIENT_INDEX_TTL = int(os.getenv("INGREDIENT_INDEX_TTL", default=300))
+INGREDIENT_SEARCH_LIMIT = int(
+    os.getenv("INGREDIENT_SEARCH_LIMIT", default=20)
+)
+COOKABLE_INDEX_TTL = int(os.getenv("COOKABLE_INDEX_TTL", default=300))
+
+POPULARITY_HALF_LIFE_DAYS = float(
+    os.getenv("POPULARITY_HALF_LIFE_DAYS", default=7)
+)
+
+
 AUTH_USER_MODEL = "users.CustomUser"
 DJOSER = {
     "HIDE_USERS": False,
@@ -0,0 +1,19 @@
+import os
+
+ASYNC_API = os.getenv("ASYNC_API", default="False") == "True"
+
+bind = os.getenv("GUNICORN_BIND", default="0.0.0.0:8000")
+# Как и у gunicorn без файла настроек, по умолчанию один процесс:
+# каждый процесс держит свои кэши в памяти и соединения с базой.
+workers = int(os.getenv("WEB_CONCURRENCY", default=1))
+if ASYNC_API:
+    wsgi_app = "backend.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "backend.wsgi:application"
+
+
+def post_worker_init(worker):
+    from api.checks import database_settings
+
+    worker.log.info("Using %s", database_settings())
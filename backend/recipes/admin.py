@@ -1,5 +1,9 @@
+from functools import partial
+
 from django.contrib import admin
+from django.db import transaction
 
+from .cookable import cookable_index
 from .models import (
     Basket,
     Favorite,
@@ -9,6 +13,7 @@ from .models import (
     Recipe,
     Tag,
 )
+from .shopping_lists import change_recipe
 
 
 @admin.register(Tag)
@@ -63,9 +68,35 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientInRecipeInline,)
     empty_value_display = "-пусто-"
 
+    def save_related(self, request, form, formsets, change):
+        """
+        Сохранение ингредиентов рецепта с переносом изменений
+        в списки покупок и индекс подбора по продуктам, как при
+        редактировании через API.
+        """
+        recipe = form.instance
+        before = dict(recipe.recipe_in.values_list("ingredient_id", "amount"))
+        super().save_related(request, form, formsets, change)
+        after = dict(recipe.recipe_in.values_list("ingredient_id", "amount"))
+        change_recipe(
+            recipe.id,
+            {
+                id: after.get(id, 0) - before.get(id, 0)
+                for id in before.keys() | after.keys()
+            },
+        )
+        transaction.on_commit(
+            partial(
+                cookable_index.change_recipe,
+                recipe.id,
+                list(before.keys() - after.keys()),
+                list(after.keys() - before.keys()),
+            )
+        )
+
     @admin.display(description="В избранном")
     def in_favorites(self, obj):
-        return obj.recipe_favorite.all().count()
+        return obj.favorites_count
 
     @admin.display(description="Ингредиенты")
     def get_ingredients(self, obj):
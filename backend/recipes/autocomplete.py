@@ -0,0 +1,89 @@
+import threading
+import time
+from bisect import bisect_left
+from itertools import islice
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для поиска по началу названия.
+
+    Хранит отсортированные названия в нижнем регистре (casefold),
+    поиск по префиксу выполняется через bisect.
+    Если ингредиентов больше INGREDIENT_INDEX_MAX_SIZE,
+    индекс не строится и поиск выполняется в базе данных.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._items = []
+        self._enabled = False
+        self._built_at = None
+
+    def invalidate(self):
+        """Пометка индекса как устаревшего."""
+        self._built_at = None
+
+    def rebuild(self):
+        """Построение индекса по таблице ингредиентов."""
+        max_size = settings.INGREDIENT_INDEX_MAX_SIZE
+        rows = list(
+            Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            )[: max_size + 1]
+        )
+        entries = sorted(
+            (name.casefold(), name, id, measurement_unit)
+            for id, name, measurement_unit in rows
+        )
+        with self._lock:
+            self._enabled = len(rows) <= max_size
+            self._keys = [entry[0] for entry in entries]
+            self._items = [
+                {"id": id, "name": name, "measurement_unit": measurement_unit}
+                for _, name, id, measurement_unit in entries
+            ]
+            self._built_at = time.monotonic()
+
+    def _is_fresh(self):
+        return (
+            self._built_at is not None
+            and time.monotonic() - self._built_at
+            < settings.INGREDIENT_INDEX_TTL
+        )
+
+    def search(self, query):
+        """
+        Поиск ингредиентов: сначала совпадения по началу названия,
+        затем по вхождению, не больше INGREDIENT_SEARCH_LIMIT.
+        Просмотр всех названий ради вхождений выполняется, только
+        если совпадений по началу меньше лимита, и заканчивается
+        на лимите. Возвращает None, если индекс отключён.
+        """
+        if not self._is_fresh():
+            self.rebuild()
+        with self._lock:
+            keys, items, enabled = self._keys, self._items, self._enabled
+        if not enabled:
+            return None
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + "\U0010ffff", start)
+        found = items[start:min(end, start + limit)]
+        if len(found) < limit:
+            contains = (
+                item
+                for index, (key, item) in enumerate(zip(keys, items))
+                if query in key and not start <= index < end
+            )
+            found += islice(contains, limit - len(found))
+        return found
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,270 @@
+import threading
+import time
+from array import array
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from api.cache import bump_version, get_version
+from recipes.models import IngredientInRecipe
+
+# id рецептов хранятся как беззнаковые 32-битные числа.
+RECIPE_ID_TYPE = np.uint32
+REBUILD_CHUNK_SIZE = 10000
+
+
+class CookableIndex:
+    """
+    Обратный индекс ингредиентов в памяти процесса для подбора рецептов
+    по имеющимся у пользователя продуктам.
+
+    Для каждого ингредиента хранится отсортированный массив id
+    рецептов, для каждого рецепта — множество его ингредиентов и их
+    число (массив, индексированный id рецепта). Изменения рецептов
+    в этом процессе применяются сразу: множество и число ингредиентов
+    меняются на месте, а изменения массивов копятся по ингредиентам
+    и переносятся в массив одним проходом при следующем чтении.
+    Изменения в других процессах попадают в индекс после
+    перестроения, которое идёт в фоне, пока запросы обслуживает
+    прежний индекс.
+
+    С общим кэшем (CACHE_IS_SHARED) каждое изменение увеличивает
+    версию ингредиентов рецептов в нём, и индекс перестраивается,
+    как только версия отличается от той, по которой он построен.
+    Без общего кэша изменения из других процессов попадают в индекс
+    при перестроении раз в COOKABLE_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuilding = threading.Lock()
+        self._postings = {}
+        self._recipes = {}
+        self._sizes = np.zeros(0, dtype=np.uint16)
+        self._changes = {}
+        self._pending = None
+        self._built_at = None
+        self._version = None
+
+    def invalidate(self):
+        """Пометка индекса как устаревшего."""
+        self._built_at = None
+
+    def rebuild(self):
+        """Построение индекса по таблице ингредиентов рецептов."""
+        version = self._shared_version()
+        with self._lock:
+            self._pending = []
+        postings = {}
+        recipes = {}
+        rows = (
+            IngredientInRecipe.objects.order_by("recipe_id")
+            .values_list("recipe_id", "ingredient_id")
+            .iterator(chunk_size=REBUILD_CHUNK_SIZE)
+        )
+        for recipe_id, ingredient_id in rows:
+            posting = postings.get(ingredient_id)
+            if posting is None:
+                posting = postings[ingredient_id] = array("I")
+            posting.append(recipe_id)
+            ingredients = recipes.get(recipe_id)
+            if ingredients is None:
+                ingredients = recipes[recipe_id] = set()
+            ingredients.add(ingredient_id)
+        postings = {
+            ingredient_id: np.frombuffer(posting, dtype=RECIPE_ID_TYPE)
+            for ingredient_id, posting in postings.items()
+        }
+        sizes = np.zeros(max(recipes, default=-1) + 1, dtype=np.uint16)
+        sizes[list(recipes)] = [len(value) for value in recipes.values()]
+        with self._lock:
+            self._postings = postings
+            self._recipes = recipes
+            self._sizes = sizes
+            self._changes = {}
+            for apply, args in self._pending:
+                apply(*args)
+            self._pending = None
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            connection.close()
+            self._rebuilding.release()
+
+    def _refresh(self):
+        if self._built_at is None:
+            with self._rebuilding:
+                if self._built_at is None:
+                    self.rebuild()
+        elif self._stale() and self._rebuilding.acquire(blocking=False):
+            threading.Thread(
+                target=self._rebuild_in_background,
+                name="cookable-index",
+                daemon=True,
+            ).start()
+
+    def _stale(self):
+        if time.monotonic() - self._built_at >= settings.COOKABLE_INDEX_TTL:
+            return True
+        return self._shared_version() != self._version
+
+    @staticmethod
+    def _shared_version():
+        """Версия ингредиентов рецептов в общем кэше."""
+        if settings.CACHE_IS_SHARED:
+            return get_version(IngredientInRecipe)
+        return None
+
+    def _publish(self):
+        """
+        Увеличение версии в общем кэше после изменения в этом процессе.
+        Если до изменения индекс был актуален, он остаётся актуальным
+        и с новой версией.
+        """
+        if not settings.CACHE_IS_SHARED:
+            return
+        version = bump_version(IngredientInRecipe)
+        with self._lock:
+            if self._version is not None and self._version + 1 == version:
+                self._version = version
+
+    def change_recipe(self, recipe_id, removed=(), added=()):
+        """
+        Изменение ингредиентов рецепта в индексе: removed и added —
+        id убранных и добавленных ингредиентов.
+        """
+        self._change(self._apply, recipe_id, removed, added)
+        self._publish()
+
+    def remove_recipe(self, recipe_id):
+        """Удаление рецепта из индекса."""
+        self._change(self._remove, recipe_id)
+        self._publish()
+
+    def _change(self, apply, *args):
+        """
+        Изменения, сделанные во время перестроения, запоминаются
+        и повторяются на новом индексе. Повторное применение изменения
+        ничего не меняет.
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((apply, args))
+            elif self._built_at is None:
+                return
+            apply(*args)
+
+    def _remove(self, recipe_id):
+        self._apply(recipe_id, self._recipes.get(recipe_id, ()), ())
+
+    def _apply(self, recipe_id, removed, added):
+        """
+        Изменение множества ингредиентов рецепта. Изменения массивов
+        рецептов ингредиентов только запоминаются в _changes.
+        """
+        current = self._recipes.get(recipe_id, set())
+        removed = current.intersection(removed)
+        added = set(added) - current
+        if not removed and not added:
+            return
+        for ingredient_id in removed:
+            deleted, inserted = self._changes.setdefault(
+                ingredient_id, (set(), set())
+            )
+            inserted.discard(recipe_id)
+            deleted.add(recipe_id)
+        for ingredient_id in added:
+            deleted, inserted = self._changes.setdefault(
+                ingredient_id, (set(), set())
+            )
+            deleted.discard(recipe_id)
+            inserted.add(recipe_id)
+        current = (current - removed) | added
+        if current:
+            self._recipes[recipe_id] = current
+        else:
+            self._recipes.pop(recipe_id, None)
+        if recipe_id >= len(self._sizes):
+            sizes = np.zeros(
+                max(recipe_id + 1, 2 * len(self._sizes)), dtype=np.uint16
+            )
+            sizes[: len(self._sizes)] = self._sizes
+            self._sizes = sizes
+        self._sizes[recipe_id] = len(current)
+
+    def _posting(self, ingredient_id):
+        """
+        Массив рецептов ингредиента с накопленными изменениями:
+        все изменения переносятся одним проходом по массиву.
+        """
+        posting = self._postings.get(ingredient_id)
+        changes = self._changes.pop(ingredient_id, None)
+        if changes is None:
+            return posting
+        deleted, inserted = changes
+        if posting is None:
+            posting = np.zeros(0, dtype=RECIPE_ID_TYPE)
+        if deleted:
+            posting = posting[
+                ~np.isin(posting, np.fromiter(deleted, RECIPE_ID_TYPE))
+            ]
+        if inserted:
+            posting = np.union1d(
+                posting, np.fromiter(inserted, RECIPE_ID_TYPE)
+            )
+        if len(posting):
+            self._postings[ingredient_id] = posting
+        else:
+            self._postings.pop(ingredient_id, None)
+            posting = None
+        return posting
+
+    def search(self, ingredient_ids, limit):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов, по
+        убыванию доли имеющихся ингредиентов, затем их количества
+        и id рецепта. Возвращает не более limit кортежей (id рецепта,
+        количество имеющихся ингредиентов, всего ингредиентов).
+
+        Совпадения считаются через unique по объединённым массивам
+        рецептов ингредиентов, поэтому стоимость запроса зависит
+        от числа совпадений, а не от наибольшего id рецепта. Лучшие
+        рецепты отбираются partition без сортировки всех найденных.
+        """
+        self._refresh()
+        with self._lock:
+            postings = [
+                posting
+                for posting in map(self._posting, set(ingredient_ids))
+                if posting is not None
+            ]
+            if not postings:
+                return []
+            recipes, matched = np.unique(
+                np.concatenate(postings), return_counts=True
+            )
+            totals = self._sizes[recipes]
+        shares = matched / totals
+        best = np.arange(len(shares))
+        if len(shares) > limit:
+            # Полностью упорядочиваются только рецепты не хуже
+            # limit-го, включая равные ему.
+            threshold = np.partition(shares, -limit)[-limit]
+            best = np.flatnonzero(shares >= threshold)
+        order = np.lexsort((recipes[best], matched[best], shares[best]))
+        best = best[order[::-1][:limit]]
+        return list(
+            zip(
+                recipes[best].tolist(),
+                matched[best].tolist(),
+                totals[best].tolist(),
+            )
+        )
+
+
+cookable_index = CookableIndex()
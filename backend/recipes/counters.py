@@ -0,0 +1,59 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def change_counter(model, pk, field, delta):
+    """Изменение счётчика на delta одним UPDATE через F()."""
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """Изменение счётчика нескольких объектов на delta одним UPDATE."""
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def count_subquery(model, field):
+    """Подзапрос количества строк model, ссылающихся на объект по field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def repair_counters(model, counters):
+    """
+    Исправление расхождений счётчиков model.
+
+    counters — словарь {поле счётчика: (модель, поле ссылки)}.
+    Возвращает количество исправленных строк.
+    """
+    actual = {
+        field: count_subquery(*source) for field, source in counters.items()
+    }
+    drifted = model.objects.annotate(
+        **{f"actual_{field}": value for field, value in actual.items()}
+    ).exclude(**{field: F(f"actual_{field}") for field in counters})
+    return model.objects.filter(pk__in=drifted.values("pk")).update(**actual)
+
+
+def recount(recipe_model, favorite_model, basket_model, user_model):
+    """Пересчёт всех счётчиков. Возвращает число исправленных строк."""
+    recipes = repair_counters(
+        recipe_model,
+        {
+            "favorites_count": (favorite_model, "recipe"),
+            "baskets_count": (basket_model, "recipe"),
+        },
+    )
+    users = repair_counters(
+        user_model, {"recipes_count": (recipe_model, "author")}
+    )
+    return recipes, users
@@ -0,0 +1,187 @@
+from bisect import bisect_left
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+from recipes.models import Follow, Recipe
+from users.models import CustomUser as User
+
+# Количество последних рецептов автора, которое хранится в кэше.
+AUTHOR_DEPTH = 20
+
+LATEST = """
+    SELECT author.id, recipe.pub_date, recipe.id
+    FROM unnest(%s::bigint[]) AS author(id)
+    CROSS JOIN LATERAL (
+        SELECT id, pub_date FROM {recipe}
+        WHERE author_id = author.id {condition}
+        ORDER BY pub_date {direction}, id {direction}
+        LIMIT %s
+    ) recipe
+"""
+
+VERSIONS = """
+    SELECT author.id, author.recipes_count, (
+        SELECT id FROM {recipe}
+        WHERE author_id = author.id
+        ORDER BY pub_date DESC, id DESC
+        LIMIT 1
+    )
+    FROM {user} author
+    WHERE author.id = ANY(%s::bigint[])
+"""
+
+
+def author_key(author_id):
+    return f"feed:{author_id}"
+
+
+def invalidate_author(author_id):
+    """Сброс кэша последних рецептов автора."""
+    caches["feed"].delete(author_key(author_id))
+
+
+def latest(author_ids, limit, after=None, reverse=False):
+    """
+    Не более limit рецептов каждого автора после ключа after
+    (pub_date, id) одним запросом по индексу (author, -pub_date, -id).
+
+    Возвращает словарь {id автора: [(pub_date, id), ...]} в порядке
+    от новых к старым, при reverse=True — от старых к новым.
+    """
+    params = [list(author_ids)]
+    condition = ""
+    if after is not None:
+        condition = "AND (pub_date, id) {} (%s, %s)".format(
+            ">" if reverse else "<"
+        )
+        params += after
+    sql = LATEST.format(
+        recipe=Recipe._meta.db_table,
+        condition=condition,
+        direction="ASC" if reverse else "DESC",
+    )
+    recipes = {author_id: [] for author_id in author_ids}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        for author_id, pub_date, recipe_id in cursor.fetchall():
+            recipes[author_id].append((pub_date, recipe_id))
+    return recipes
+
+
+def author_versions(author_ids):
+    """
+    Версии лент авторов: количество рецептов и id последнего рецепта,
+    которые меняются при добавлении и удалении рецептов.
+    """
+    sql = VERSIONS.format(
+        recipe=Recipe._meta.db_table, user=User._meta.db_table
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(author_ids)])
+        return {
+            author_id: (count, recipe_id)
+            for author_id, count, recipe_id in cursor.fetchall()
+        }
+
+
+def author_heads(author_ids):
+    """
+    Последние AUTHOR_DEPTH рецептов авторов из кэша; недостающие
+    загружаются одним запросом и кэшируются.
+
+    Кэш сбрасывается сигналами при добавлении и удалении рецептов.
+    Сброс в кэше памяти процесса не виден остальным процессам, поэтому
+    без общего кэша (CACHE_IS_SHARED) списки хранятся с версией ленты
+    автора и сверяются с ней одним запросом.
+
+    Возвращает словарь {id автора: (рецепты, все ли рецепты в списке)}.
+    """
+    cache = caches["feed"]
+    keys = {author_key(author_id): author_id for author_id in author_ids}
+    heads = {
+        keys[key]: value for key, value in cache.get_many(keys).items()
+    }
+    versions = {}
+    if not settings.CACHE_IS_SHARED:
+        versions = author_versions(author_ids)
+        heads = {
+            author_id: head
+            for author_id, head in heads.items()
+            if head[2] == versions.get(author_id)
+        }
+    missing = [author_id for author_id in author_ids if author_id not in heads]
+    if missing:
+        loaded = {
+            author_id: (
+                recipes[:AUTHOR_DEPTH],
+                len(recipes) <= AUTHOR_DEPTH,
+                versions.get(author_id),
+            )
+            for author_id, recipes in latest(missing, AUTHOR_DEPTH + 1).items()
+        }
+        cache.set_many(
+            {author_key(id): head for id, head in loaded.items()},
+            settings.API_CACHE_TIMEOUT,
+        )
+        heads.update(loaded)
+    return {
+        author_id: (recipes, complete)
+        for author_id, (recipes, complete, _) in heads.items()
+    }
+
+
+def subscription_feed(user_id, size, after=None, reverse=False):
+    """
+    Ключи (pub_date, id) не более size рецептов авторов, на которых
+    подписан пользователь, после ключа after: от новых к старым,
+    при reverse=True — от старых к новым.
+
+    Ленты авторов сливаются k-путевым слиянием. Последние рецепты
+    каждого автора берутся из кэша; авторы, у которых кэшированного
+    списка не хватает до конца страницы, догружаются одним запросом.
+    """
+    author_ids = list(
+        Follow.objects.filter(
+            user_id=user_id, following__isnull=False
+        ).values_list("following_id", flat=True)
+    )
+    if not author_ids:
+        return []
+    if after is not None:
+        after = tuple(after)
+    if reverse:
+        # Более новые рецепты могут быть не в кэше, поэтому обратная
+        # страница целиком читается из базы.
+        streams = latest(author_ids, size, after, reverse=True).values()
+        return list(islice(merge(*streams), size))
+    streams = {}
+    for author_id, (recipes, complete) in author_heads(author_ids).items():
+        if after is not None:
+            # Рецепты упорядочены по убыванию: пропуск ключей >= after.
+            start = bisect_left(recipes, True, key=lambda key: key < after)
+            recipes = recipes[start:]
+        streams[author_id] = (recipes, complete)
+    page = merge_streams(streams, size)
+    boundary = page[-1] if len(page) == size else None
+    deep = [
+        author_id
+        for author_id, (recipes, complete) in streams.items()
+        if not complete
+        and (not recipes or boundary is None or recipes[-1] > boundary)
+    ]
+    if not deep:
+        return page
+    recipes = latest(deep, size, after)
+    for author_id in deep:
+        streams[author_id] = (recipes[author_id], True)
+    return merge_streams(streams, size)
+
+
+def merge_streams(streams, size):
+    """Первые size ключей слияния лент авторов по убыванию."""
+    recipes = (recipes for recipes, _ in streams.values())
+    return list(islice(merge(*recipes, reverse=True), size))
@@ -0,0 +1,101 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image
+
+from api.cache import bump_version
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.IMAGE_PROCESSING_WORKERS, 1),
+    thread_name_prefix="recipe-images",
+)
+
+
+def variant_name(name, width, ext):
+    """Имя уменьшенной копии изображения заданной ширины."""
+    root, _ = os.path.splitext(name)
+    return f"{root}_{width}w.{ext}"
+
+
+def process_image(name):
+    """
+    Создание копий изображения в WebP и JPEG для каждой ширины
+    меньше исходной: thumbnail не увеличивает изображение, и копии
+    большей ширины совпадали бы с копией исходного размера. После
+    записи копий у рецептов с этим изображением сохраняется ширина
+    исходного.
+    """
+    try:
+        with default_storage.open(name) as file:
+            original = Image.open(file)
+            original.load()
+        for width in settings.RECIPE_IMAGE_WIDTHS:
+            if width >= original.width:
+                continue
+            image = original.convert("RGB")
+            image.thumbnail((width, image.height))
+            for ext, format in IMAGE_FORMATS.items():
+                variant = variant_name(name, width, ext)
+                if default_storage.exists(variant):
+                    continue
+                buffer = io.BytesIO()
+                image.save(buffer, format=format, quality=85)
+                default_storage.save(variant, ContentFile(buffer.getvalue()))
+        # По ширине исходного изображения сериализатор узнаёт, какие
+        # копии уже созданы.
+        if Recipe.objects.filter(image=name).update(
+            image_width=original.width
+        ):
+            bump_version(Recipe)
+    except Exception:
+        logger.exception("Failed to process image %s", name)
+    # Рецепт могли удалить или заменить изображение, пока создавались
+    # копии: тогда удаление копий могло пройти раньше их записи.
+    remove_variants(name)
+
+
+def remove_variants(name):
+    """
+    Удаление копий изображения, на которое больше не ссылается
+    ни один рецепт.
+    """
+    try:
+        if Recipe.objects.filter(image=name).exists():
+            return
+        for width in settings.RECIPE_IMAGE_WIDTHS:
+            for ext in IMAGE_FORMATS:
+                default_storage.delete(variant_name(name, width, ext))
+    except Exception:
+        logger.exception("Failed to remove variants of image %s", name)
+    finally:
+        if settings.IMAGE_PROCESSING_WORKERS:
+            connection.close()
+
+
+def schedule(function, name):
+    """Постановка задачи над изображением в очередь фоновой обработки."""
+    if settings.IMAGE_PROCESSING_WORKERS:
+        executor.submit(function, name)
+    else:
+        function(name)
+
+
+def schedule_image_processing(name):
+    """Постановка изображения в очередь фоновой обработки."""
+    schedule(process_image, name)
+
+
+def schedule_variants_removal(name):
+    """Постановка удаления копий изображения в очередь."""
+    schedule(remove_variants, name)
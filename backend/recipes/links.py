@@ -0,0 +1,94 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from recipes.counters import change_counters
+from recipes.models import Basket, Favorite, Follow, Recipe
+from recipes.shopping_lists import change_basket
+from users.models import CustomUser as User
+
+# Связи пользователя с объектами: поле объекта и его модель.
+TARGETS = {
+    Favorite: ("recipe", Recipe),
+    Basket: ("recipe", Recipe),
+    Follow: ("following", User),
+}
+
+COUNTERS = {
+    Favorite: "favorites_count",
+    Basket: "baskets_count",
+}
+
+ADD = """
+    WITH target AS (
+        SELECT id{columns} FROM {target_table}
+        WHERE id = ANY(%(ids)s::bigint[])
+    ), added AS (
+        INSERT INTO {table} (user_id, {target}_id{created})
+        SELECT %(user)s, id{created_value} FROM target
+        ON CONFLICT (user_id, {target}_id) DO NOTHING
+        RETURNING id, {target}_id
+    )
+    SELECT target.id, added.id{target_columns} FROM target
+    LEFT JOIN added ON added.{target}_id = target.id
+    ORDER BY array_position(%(ids)s::bigint[], target.id)
+"""
+
+REMOVE = """
+    DELETE FROM {table} WHERE user_id = %s AND {target}_id = ANY(%s)
+    RETURNING {target}_id
+"""
+
+
+def add(model, user_id, target_ids, columns=()):
+    """
+    Добавление связей пользователя с объектами target_ids одним
+    запросом INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Возвращает строки (id объекта, id связи, *columns) для найденных
+    объектов в порядке target_ids; id связи равен None, если связь
+    уже была. Счётчики и списки покупок, которые при сохранении
+    через ORM меняют сигналы, обновляются здесь же в той же транзакции.
+    """
+    target, target_model = TARGETS[model]
+    fields = {field.name for field in model._meta.concrete_fields}
+    sql = ADD.format(
+        table=model._meta.db_table,
+        target=target,
+        target_table=target_model._meta.db_table,
+        columns="".join(f", {column}" for column in columns),
+        target_columns="".join(f", target.{column}" for column in columns),
+        created=", created" if "created" in fields else "",
+        created_value=", %(now)s" if "created" in fields else "",
+    )
+    params = {"ids": list(target_ids), "user": user_id, "now": timezone.now()}
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        added = [row[0] for row in rows if row[1] is not None]
+        if added:
+            apply_side_effects(model, user_id, added, 1)
+    return rows
+
+
+def remove(model, user_id, target_ids):
+    """
+    Удаление связей пользователя с объектами target_ids одним
+    DELETE, счётчики и список покупок меняются в той же транзакции.
+    Возвращает id объектов, связи с которыми были удалены.
+    """
+    target, _ = TARGETS[model]
+    sql = REMOVE.format(table=model._meta.db_table, target=target)
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, list(target_ids)])
+        removed = [row[0] for row in cursor.fetchall()]
+        if removed:
+            apply_side_effects(model, user_id, removed, -1)
+    return removed
+
+
+def apply_side_effects(model, user_id, target_ids, sign):
+    """Изменение счётчиков рецептов и списка покупок пользователя."""
+    if model in COUNTERS:
+        change_counters(Recipe, target_ids, COUNTERS[model], sign)
+    if model is Basket:
+        change_basket(user_id, target_ids, sign)
@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_version
+
+
+class BaseLoadCommand(BaseCommand):
+    """
+    Базовая команда пакетной загрузки справочников из csv или json.
+
+    Строки читаются потоком, дубликаты по уникальному ключу отбрасываются,
+    запись идёт пачками: через COPY на PostgreSQL с psycopg2,
+    иначе через bulk_create. Сигналы моделей при этом не отправляются,
+    поэтому после загрузки вызывается after_load.
+    """
+
+    model = None
+    fields = ()
+    unique_fields = ()
+    default_path = None
+    default_batch_size = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=self.default_path,
+            help="Path to a .csv or .json file.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=self.default_batch_size,
+            help="Number of rows written per batch.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Read and validate the file without writing to the database.",
+        )
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Update existing rows instead of skipping them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be a positive integer.")
+        start = time.perf_counter()
+        rows = self.unique_rows(self.read_rows(options["path"]))
+        total = written = 0
+        with transaction.atomic():
+            for batch in self.batches(rows, options["batch_size"]):
+                if not options["dry_run"]:
+                    written += self.write(batch, options["upsert"])
+                total += len(batch)
+        if written:
+            self.after_load()
+        elapsed = time.perf_counter() - start
+        rate = total / elapsed if elapsed else total
+        if options["dry_run"]:
+            result = f"Checked {total}"
+        else:
+            result = f"Loaded {written} of {total}"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result} {self.model.__name__} rows "
+                f"in {elapsed:.3f}s ({rate:.0f} rows/s)."
+            )
+        )
+
+    def after_load(self):
+        """
+        Действия сигналов сохранения модели после записи строк:
+        сброс кэшированных ответов API.
+        """
+        bump_version(self.model)
+
+    def read_rows(self, path):
+        """Построчное чтение файла в кортежи значений полей."""
+        try:
+            with open(path, encoding="utf8") as f:
+                if path.endswith(".json"):
+                    for item in json.load(f):
+                        yield tuple(item[field] for field in self.fields)
+                    return
+                for row in csv.reader(f, delimiter=","):
+                    if not row:
+                        continue
+                    if len(row) != len(self.fields):
+                        raise CommandError(f"Malformed row: {row}")
+                    yield tuple(row)
+        except (OSError, KeyError, ValueError) as error:
+            raise CommandError(f"Cannot read {path}: {error}")
+
+    def unique_rows(self, rows):
+        """Отбрасывание повторов по уникальному ключу."""
+        key_indexes = [self.fields.index(name) for name in self.unique_fields]
+        seen = set()
+        for row in rows:
+            key = tuple(row[index] for index in key_indexes)
+            if key not in seen:
+                seen.add(key)
+                yield row
+
+    @staticmethod
+    def batches(rows, size):
+        rows = iter(rows)
+        while batch := list(islice(rows, size)):
+            yield batch
+
+    def write(self, batch, upsert):
+        """
+        Запись пачки строк. Возвращает количество добавленных строк,
+        при upsert — добавленных и обновлённых.
+        """
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                if hasattr(cursor.cursor, "copy_expert"):
+                    return self.copy(cursor, batch, upsert)
+        objs = [self.model(**dict(zip(self.fields, row))) for row in batch]
+        if upsert:
+            self.model.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=self.unique_fields,
+                update_fields=self.update_fields,
+            )
+            return len(objs)
+        # bulk_create с ignore_conflicts не сообщает, какие строки
+        # добавлены, поэтому они считаются по размеру таблицы.
+        count = self.model.objects.count()
+        self.model.objects.bulk_create(objs, ignore_conflicts=True)
+        return self.model.objects.count() - count
+
+    @property
+    def update_fields(self):
+        return [name for name in self.fields if name not in self.unique_fields]
+
+    def copy(self, cursor, batch, upsert):
+        """Загрузка пачки через COPY во временную таблицу и INSERT из неё."""
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        temp_table = quote(f"{self.model._meta.db_table}_load")
+        columns = ", ".join(quote(name) for name in self.fields)
+        conflict = ", ".join(quote(name) for name in self.unique_fields)
+        if upsert:
+            action = "UPDATE SET " + ", ".join(
+                f"{quote(name)} = EXCLUDED.{quote(name)}"
+                for name in self.update_fields
+            )
+        else:
+            action = "NOTHING"
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {temp_table} ON COMMIT DROP "
+            f"AS SELECT {columns} FROM {table} WITH NO DATA"
+        )
+        cursor.execute(f"TRUNCATE {temp_table}")
+        cursor.cursor.copy_expert(
+            f"COPY {temp_table} ({columns}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT {columns} FROM {temp_table} "
+            f"ON CONFLICT ({conflict}) DO {action}"
+        )
+        return cursor.rowcount
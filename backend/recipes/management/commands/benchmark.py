@@ -0,0 +1,491 @@
+import http.client
+import json
+import mmap
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.middleware import QueryTimer
+from recipes.models import Basket, Ingredient, Recipe, ShoppingListItem, Tag
+from recipes.shopping_lists import change_basket
+from users.models import CustomUser as User
+
+EXPORT_SCENARIO = "shopping_cart_export"
+EXPORT_FORMATS = ("txt", "csv", "json")
+EXPORT_MODES = {"streamed": False, "buffered": True}
+EXPORT_MEMORY_RUNS = 5
+
+
+def resident_memory():
+    """Текущий RSS процесса в байтах, None вне Linux."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * mmap.PAGESIZE
+    except OSError:
+        return None
+
+
+class PeakMemory:
+    """
+    Прирост пикового RSS процесса внутри блока with. RSS опрашивается
+    из отдельного потока, поэтому время внутри блока не замеряется.
+    """
+
+    def __enter__(self):
+        self.baseline = self.peak = resident_memory()
+        if self.baseline is not None:
+            self.done = threading.Event()
+            self.thread = threading.Thread(target=self.sample, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.baseline is not None:
+            self.done.set()
+            self.thread.join()
+            self.sample()
+
+    def sample(self):
+        self.peak = max(self.peak, resident_memory())
+        while not self.done.wait(0.0005):
+            self.peak = max(self.peak, resident_memory())
+
+    @property
+    def growth(self):
+        if self.baseline is None:
+            return None
+        return self.peak - self.baseline
+
+
+class Command(BaseCommand):
+    help = "benchmark the main API endpoints and write the results to JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Number of measured requests per scenario.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=10,
+            help="Number of unmeasured requests per scenario.",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            help="Run only the given scenario, may be repeated.",
+        )
+        parser.add_argument(
+            "--base-url",
+            default=None,
+            help="Send requests over HTTP to a running server, e.g. "
+            "http://127.0.0.1:8000, instead of the Django test client. "
+            "Query counts are not available in this mode.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of concurrent connections, requires --base-url.",
+        )
+        parser.add_argument(
+            "--export-basket",
+            type=int,
+            default=1000,
+            help=f"Number of recipes in the cart for the {EXPORT_SCENARIO} "
+            "scenario, which compares the streamed shopping list export "
+            "with a buffered one. Runs only with the Django test client.",
+        )
+        parser.add_argument("--output", default="benchmark.json")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("At least 2 requests per scenario are needed.")
+        if options["concurrency"] > 1 and not options["base_url"]:
+            raise CommandError("--concurrency requires --base-url.")
+        self.random = random.Random(options["seed"])
+        user = (
+            User.objects.annotate(
+                cart_size=Count("baskets", distinct=True)
+            )
+            .filter(cart_size__gt=0, follower__isnull=False)
+            .order_by("-cart_size", "id")
+            .first()
+        )
+        if user is None or not Recipe.objects.exists():
+            raise CommandError("No data to benchmark, run generate_data.")
+        token, _ = Token.objects.get_or_create(user=user)
+        self.authorization = f"Token {token.key}"
+        self.base_url = options["base_url"]
+        if self.base_url:
+            self.local = threading.local()
+        else:
+            host = next(
+                (host for host in settings.ALLOWED_HOSTS if "*" not in host),
+                "localhost",
+            ).lstrip(".")
+            self.host = host
+            self.clients = {
+                False: Client(HTTP_HOST=host),
+                True: Client(
+                    HTTP_HOST=host, HTTP_AUTHORIZATION=self.authorization
+                ),
+            }
+        self.recipe_ids = list(Recipe.objects.values_list("id", flat=True))
+        self.tag_slugs = list(Tag.objects.values_list("slug", flat=True))
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list("id", flat=True)
+        )
+        self.ingredient_names = list(
+            Ingredient.objects.values_list("name", flat=True)
+        )
+        self.prefixes = list({name[:3] for name in self.ingredient_names})
+        self.unfavorited_ids = list(
+            Recipe.objects.exclude(recipe_favorite__user=user).values_list(
+                "id", flat=True
+            )
+        )
+        scenarios = self.scenarios()
+        export = not self.base_url
+        if options["scenario"]:
+            unknown = set(options["scenario"]) - set(scenarios) - {
+                EXPORT_SCENARIO
+            }
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {sorted(unknown)}.")
+            export = EXPORT_SCENARIO in options["scenario"]
+            if export and self.base_url:
+                raise CommandError(
+                    f"{EXPORT_SCENARIO} requires the Django test client."
+                )
+            scenarios = {
+                name: scenarios[name]
+                for name in options["scenario"]
+                if name != EXPORT_SCENARIO
+            }
+        results = {}
+        for name, scenario in scenarios.items():
+            results[name] = self.run(
+                scenario,
+                options["warmup"],
+                options["requests"],
+                options["concurrency"],
+            )
+            queries = results[name]["queries_mean"]
+            self.stdout.write(
+                "{name:<24} p50 {p50:8.2f}ms  p95 {p95:8.2f}ms  "
+                "p99 {p99:8.2f}ms  {rps:8.1f} rps".format(
+                    name=name, **results[name]
+                )
+                + ("" if queries is None else f"  {queries:6.1f} queries")
+            )
+        if export:
+            results[EXPORT_SCENARIO] = self.export(
+                options["export_basket"],
+                options["warmup"],
+                options["requests"],
+            )
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "database": connection.vendor,
+            "base_url": self.base_url,
+            "concurrency": options["concurrency"],
+            "dataset": {
+                "users": User.objects.count(),
+                "recipes": len(self.recipe_ids),
+                "ingredients": Ingredient.objects.count(),
+                "tags": len(self.tag_slugs),
+            },
+            "requests": options["requests"],
+            "warmup": options["warmup"],
+            "seed": options["seed"],
+            "scenarios": results,
+        }
+        with open(options["output"], "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Results written to {options['output']}.")
+        )
+
+    def scenarios(self):
+        """
+        Сценарии нагрузки: функции, возвращающие признак авторизации,
+        адрес и, если он не GET, метод запроса.
+        """
+        favorited = []
+
+        def favorite_toggle():
+            """
+            Поочерёдное добавление случайного рецепта в избранное
+            и его удаление: после чётного числа запросов избранное
+            пользователя не меняется.
+            """
+            if favorited:
+                recipe_id, method = favorited.pop(), "DELETE"
+            else:
+                recipe_id = self.random.choice(self.unfavorited_ids)
+                favorited.append(recipe_id)
+                method = "POST"
+            return True, f"/api/recipes/{recipe_id}/favorite/", method
+
+        def tags(count):
+            return "&".join(
+                f"tags={slug}"
+                for slug in self.random.sample(
+                    self.tag_slugs, min(count, len(self.tag_slugs))
+                )
+            )
+
+        return {
+            "recipes_list": lambda: (
+                False,
+                f"/api/recipes/?page={self.random.randint(1, 10)}",
+            ),
+            "recipes_list_filtered": lambda: (
+                True,
+                f"/api/recipes/?{tags(2)}&is_favorited=1",
+            ),
+            "recipes_list_many_tags": lambda: (
+                False,
+                f"/api/recipes/?{tags(12)}",
+            ),
+            "recipes_list_cart": lambda: (
+                True,
+                "/api/recipes/?is_in_shopping_cart=1",
+            ),
+            "recipes_search": lambda: (
+                False,
+                "/api/recipes/?"
+                + urlencode(
+                    {"search": self.random.choice(self.ingredient_names)}
+                ),
+            ),
+            "recipes_popular": lambda: (
+                False,
+                f"/api/recipes/popular/?{tags(2)}",
+            ),
+            "recipe_detail": lambda: (
+                True,
+                f"/api/recipes/{self.random.choice(self.recipe_ids)}/",
+            ),
+            "subscriptions": lambda: (
+                True,
+                "/api/users/subscriptions/?recipes_limit=3",
+            ),
+            "subscription_feed": lambda: (
+                True,
+                "/api/recipes/feed/",
+            ),
+            "cookable": lambda: (
+                False,
+                "/api/recipes/cookable/?"
+                + "&".join(
+                    f"ingredients={id}"
+                    for id in self.random.sample(
+                        self.ingredient_ids, min(5, len(self.ingredient_ids))
+                    )
+                ),
+            ),
+            "ingredient_search": lambda: (
+                False,
+                f"/api/ingredients/?name={self.random.choice(self.prefixes)}",
+            ),
+            "shopping_cart_download": lambda: (
+                True,
+                "/api/recipes/download_shopping_cart/",
+            ),
+            "favorite_toggle": favorite_toggle,
+        }
+
+    def run(self, scenario, warmup, requests, concurrency):
+        """Выполнение запросов сценария с замером времени."""
+        for _ in range(warmup):
+            self.request(*scenario())
+        calls = [scenario() for _ in range(requests)]
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                measured = list(
+                    executor.map(lambda call: self.measure(*call), calls)
+                )
+        else:
+            measured = [self.measure(*call) for call in calls]
+        elapsed = time.perf_counter() - started
+        durations = [duration for duration, _, _ in measured]
+        queries = [count for _, count, _ in measured if count is not None]
+        statuses = Counter(status for _, _, status in measured)
+        percentiles = statistics.quantiles(
+            durations, n=100, method="inclusive"
+        )
+        return {
+            "p50": percentiles[49],
+            "p95": percentiles[94],
+            "p99": percentiles[98],
+            "mean": statistics.fmean(durations),
+            "max": max(durations),
+            "rps": requests / elapsed,
+            "queries_mean": statistics.fmean(queries) if queries else None,
+            "queries_max": max(queries) if queries else None,
+            "statuses": dict(
+                sorted((str(code), n) for code, n in statuses.items())
+            ),
+        }
+
+    def export(self, basket_size, warmup, requests):
+        """
+        Выгрузка списка покупок корзины из basket_size рецептов
+        потоком и целиком, как до перехода на StreamingHttpResponse:
+        время до первого байта, полное время, прирост пикового RSS
+        и пик памяти Python-объектов. Корзина создаётся во временной
+        транзакции, которая затем откатывается.
+        """
+        recipe_ids = self.random.sample(
+            self.recipe_ids, min(basket_size, len(self.recipe_ids))
+        )
+        client = APIClient(HTTP_HOST=self.host)
+        results = {"basket": len(recipe_ids), "formats": {}}
+        with transaction.atomic():
+            user = User.objects.create(
+                username="benchmark-export",
+                email="benchmark-export@example.com",
+            )
+            Basket.objects.bulk_create(
+                Basket(user=user, recipe_id=recipe_id)
+                for recipe_id in recipe_ids
+            )
+            change_basket(user.id, recipe_ids, 1)
+            results["rows"] = ShoppingListItem.objects.filter(
+                user=user
+            ).count()
+            client.force_authenticate(user=user)
+            for format in EXPORT_FORMATS:
+                url = f"/api/recipes/download_shopping_cart/?format={format}"
+                modes = results["formats"][format] = {}
+                for mode, buffered in EXPORT_MODES.items():
+                    result = modes[mode] = self.run_export(
+                        client, url, buffered, warmup, requests
+                    )
+                    rss = result["rss_growth_kib"]
+                    self.stdout.write(
+                        "{name:<24} ttfb p50 {ttfb_p50:8.2f}ms  "
+                        "total p50 {total_p50:8.2f}ms  "
+                        "heap {heap_peak_kib:8.1f}KiB".format(
+                            name=f"export {format} {mode}", **result
+                        )
+                        + ("" if rss is None else f"  rss +{rss:.1f}KiB")
+                    )
+            transaction.set_rollback(True)
+        return results
+
+    def run_export(self, client, url, buffered, warmup, requests):
+        """Замеры выгрузки списка покупок в одном режиме."""
+        for _ in range(warmup):
+            self.export_request(client, url, buffered)
+        measured = [
+            self.export_request(client, url, buffered)
+            for _ in range(requests)
+        ]
+        # Память замеряется отдельными запросами: опрос RSS и
+        # tracemalloc замедляют выгрузку.
+        rss, heap = [], []
+        for _ in range(EXPORT_MEMORY_RUNS):
+            with PeakMemory() as memory:
+                self.export_request(client, url, buffered)
+            rss.append(memory.growth)
+            tracemalloc.start()
+            self.export_request(client, url, buffered)
+            heap.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        ttfb = statistics.quantiles(
+            [ttfb for ttfb, _, _ in measured], n=100, method="inclusive"
+        )
+        total = statistics.quantiles(
+            [total for _, total, _ in measured], n=100, method="inclusive"
+        )
+        return {
+            "ttfb_p50": ttfb[49],
+            "ttfb_p95": ttfb[94],
+            "total_p50": total[49],
+            "total_p95": total[94],
+            "bytes": measured[0][2],
+            "rss_growth_kib": (
+                None if None in rss else max(rss) / 1024
+            ),
+            "heap_peak_kib": max(heap) / 1024,
+        }
+
+    def export_request(self, client, url, buffered):
+        """
+        Время до первого байта и полное время выгрузки в мс, размер
+        ответа. В режиме buffered ответ целиком собирается в памяти
+        до отправки первого байта.
+        """
+        start = time.perf_counter()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(
+                f"{url} returned {response.status_code} status."
+            )
+        chunks = response.streaming_content
+        if buffered:
+            chunks = [b"".join(chunks)]
+        first, size = None, 0
+        for chunk in chunks:
+            if first is None:
+                first = time.perf_counter()
+            size += len(chunk)
+        end = time.perf_counter()
+        return (first - start) * 1000, (end - start) * 1000, size
+
+    def measure(self, authorized, url, method="GET"):
+        """Время ответа в мс, число SQL-запросов и код ответа."""
+        timer = None if self.base_url else QueryTimer()
+        start = time.perf_counter()
+        if timer is None:
+            status = self.request(authorized, url, method)
+        else:
+            with connection.execute_wrapper(timer):
+                status = self.request(authorized, url, method)
+        duration = (time.perf_counter() - start) * 1000
+        return duration, timer.count if timer else None, status
+
+    def request(self, authorized, url, method="GET"):
+        if not self.base_url:
+            response = self.clients[authorized].generic(method, url)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            return response.status_code
+        base = urlsplit(self.base_url)
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(
+                base.netloc, timeout=60
+            )
+        headers = {"Authorization": self.authorization} if authorized else {}
+        try:
+            conn.request(method, base.path.rstrip("/") + url, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.local.conn = None
+            return "error"
+        return response.status
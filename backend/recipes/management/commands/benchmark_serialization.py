@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeGetSerializer
+from recipes.models import Recipe
+from users.models import CustomUser as User
+
+
+class Command(BaseCommand):
+    help = "measure recipe serialization and JSON rendering per 100 recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100)
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=50,
+            help="Number of measured runs, the median is reported.",
+        )
+
+    def handle(self, *args, **options):
+        user = (
+            User.objects.annotate(follows=Count("follower"))
+            .order_by("-follows", "id")
+            .first()
+        )
+        if user is None:
+            raise CommandError("No data to benchmark, run generate_data.")
+        request = Request(RequestFactory().get("/api/recipes/"))
+        request.user = user
+        recipes = list(
+            Recipe.objects.with_related(user).order_by("-pub_date", "-id")[
+                : options["recipes"]
+            ]
+        )
+        if not recipes:
+            raise CommandError("No data to benchmark, run generate_data.")
+        scale = 100 / len(recipes)
+        context = {"request": request}
+        data = RecipeGetSerializer(recipes, many=True, context=context).data
+        timings = {
+            "serialize": self.measure(
+                lambda: RecipeGetSerializer(
+                    recipes, many=True, context=context
+                ).data,
+                options["repeat"],
+            )
+        }
+        contents = {}
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            name = type(renderer).__name__
+            contents[name] = renderer.render(data)
+            timings[f"render {name}"] = self.measure(
+                lambda: renderer.render(data), options["repeat"]
+            )
+        for name, duration in timings.items():
+            self.stdout.write(
+                f"{name:<28} {duration * scale:8.2f}ms per 100 recipes"
+            )
+        if len(set(contents.values())) != 1:
+            raise CommandError("Renderers produced different output.")
+        self.stdout.write(self.style.SUCCESS("Renderer output is identical."))
+
+    @staticmethod
+    def measure(function, repeat):
+        """Медиана времени вызова function в мс."""
+        function()
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            durations.append((time.perf_counter() - start) * 1000)
+        return statistics.median(durations)
@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from api.pagination import CustomPagination
+from recipes.models import Recipe, ShoppingListItem, Tag
+from users.models import CustomUser as User
+
+
+class Command(BaseCommand):
+    help = "print EXPLAIN ANALYZE output for the canonical API queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            default=None,
+            help="User id for the per-user filters, defaults to the user "
+            "with the largest shopping cart.",
+        )
+        parser.add_argument("--limit", type=int, default=6)
+        parser.add_argument(
+            "--tags",
+            type=int,
+            default=2,
+            help="Number of tags in the tag filter.",
+        )
+        parser.add_argument(
+            "--search",
+            default=None,
+            help="Text for the full-text search, defaults to the name of "
+            "a recipe.",
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["user"])
+        limit = options["limit"]
+        tags = "&".join(
+            f"tags={slug}"
+            for slug in Tag.objects.values_list("slug", flat=True)[
+                : options["tags"]
+            ]
+        )
+        recipe = Recipe.objects.filter(author=user).first() or (
+            Recipe.objects.first()
+        )
+        author = recipe.author_id if recipe else user.id
+        search = options["search"] or (recipe.name if recipe else "суп")
+        queries = {
+            "recipes": self.recipes(user, "", limit),
+            "recipes ?author": self.recipes(user, f"author={author}", limit),
+            "recipes ?tags": self.recipes(user, tags, limit),
+            "recipes ?is_favorited": self.recipes(
+                user, "is_favorited=1", limit
+            ),
+            "recipes ?is_in_shopping_cart": self.recipes(
+                user, "is_in_shopping_cart=1", limit
+            ),
+            "recipes ?tags&is_favorited": self.recipes(
+                user, f"{tags}&is_favorited=1", limit
+            ),
+            "recipes ?search": self.recipes(
+                user, urlencode({"search": search}), limit
+            ),
+            "recipes ?cursor deep page": self.deep_page(user, limit),
+            "recipes popular": Recipe.objects.annotate_user_flags(user)
+            .filter(popularity__isnull=False)
+            .annotate(score=F("popularity__score"))
+            .order_by("-score", "-id")[:limit],
+            "subscriptions": User.objects.filter(follow__user=user).order_by(
+                "id"
+            )[:limit],
+            "subscription recipes": Recipe.objects.filter(
+                author__follow__user=user
+            ).order_by("author", "-pub_date", "-id"),
+            "shopping list": ShoppingListItem.objects.filter(user=user)
+            .order_by("ingredient__name")
+            .values_list(
+                "ingredient__name",
+                "ingredient__measurement_unit",
+                "total_amount",
+            ),
+            "recipe favorites": Recipe.objects.filter(
+                pk=recipe.pk if recipe else None
+            )
+            .annotate(count=Count("recipe_favorite__user"))
+            .values("count"),
+        }
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(analyze=True, buffers=True))
+            self.stdout.write("")
+
+    @staticmethod
+    def get_user(user_id):
+        users = User.objects.all()
+        if user_id is not None:
+            users = users.filter(pk=user_id)
+        user = (
+            users.annotate(cart_size=Count("baskets"))
+            .order_by("-cart_size", "id")
+            .first()
+        )
+        if user is None:
+            raise CommandError("User not found.")
+        return user
+
+    @staticmethod
+    def recipes(user, query, limit):
+        """Запрос списка рецептов в том виде, в котором его строит API."""
+        filterset = RecipeFilter(
+            data=QueryDict(query),
+            queryset=Recipe.objects.annotate_user_flags(user),
+            request=SimpleNamespace(user=user),
+        )
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        ordering = ("-pub_date", "-id")
+        if filterset.form.cleaned_data.get("search"):
+            ordering = RecipeFilter.search_ordering
+        return filterset.qs.order_by(*ordering)[:limit]
+
+    @staticmethod
+    def deep_page(user, limit):
+        """
+        Страница списка рецептов по курсору на последней пятой части
+        списка: как и первые страницы, она должна читать индекс
+        с ключа курсора.
+        """
+        recipes = Recipe.objects.annotate_user_flags(user).order_by(
+            "-pub_date", "-id"
+        )
+        offset = Recipe.objects.count() * 4 // 5
+        after = (
+            Recipe.objects.order_by("-pub_date", "-id")
+            .values_list("pub_date", "id")[offset:]
+            .first()
+        )
+        if after is None:
+            return recipes[: limit + 1]
+        pagination = CustomPagination()
+        pagination.fields = ["pub_date", "id"]
+        return recipes.filter(
+            pagination.keyset_condition(after, descending=True)
+        )[: limit + 1]
@@ -0,0 +1,223 @@
+import io
+import random
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipes.counters import recount
+from recipes.models import (
+    Basket,
+    Favorite,
+    Follow,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipePopularity,
+    ShoppingListItem,
+    Tag,
+    TagInRecipe,
+)
+from recipes.popularity import refresh as refresh_popularity
+from recipes.search import rebuild as rebuild_search
+from recipes.shopping_lists import rebuild as rebuild_shopping_lists
+from users.models import CustomUser as User
+
+IMAGE_NAME = "data/images/synthetic.png"
+
+
+class Command(BaseCommand):
+    help = "generate synthetic users, recipes, follows, favorites and baskets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=10,
+            help="Number of recipes per user.",
+        )
+        parser.add_argument(
+            "--follows",
+            type=int,
+            default=10,
+            help="Number of followed authors per user.",
+        )
+        parser.add_argument(
+            "--favorites",
+            type=int,
+            default=20,
+            help="Number of favorited recipes per user.",
+        )
+        parser.add_argument(
+            "--baskets",
+            type=int,
+            default=10,
+            help="Number of recipes in the shopping cart per user.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=None,
+            help="Random seed for reproducible data.",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+        if len(ingredient_ids) < 15:
+            raise CommandError(
+                "At least 15 ingredients are required, run ingredients_csv."
+            )
+        start = time.perf_counter()
+        with transaction.atomic():
+            tag_ids = self.tags()
+            self.image()
+            user_ids = self.users(options["users"])
+            recipe_ids = self.recipes(
+                user_ids, options["recipes"], ingredient_ids, tag_ids
+            )
+            self.links(
+                Follow,
+                "following_id",
+                user_ids,
+                user_ids,
+                options["follows"],
+            )
+            self.links(
+                Favorite,
+                "recipe_id",
+                user_ids,
+                recipe_ids,
+                options["favorites"],
+            )
+            self.links(
+                Basket,
+                "recipe_id",
+                user_ids,
+                recipe_ids,
+                options["baskets"],
+            )
+            recount(Recipe, Favorite, Basket, User)
+            rebuild_shopping_lists(
+                ShoppingListItem, Basket, IngredientInRecipe
+            )
+            rebuild_search(Recipe, IngredientInRecipe, Ingredient)
+            refresh_popularity(RecipePopularity, Favorite, Basket)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {len(user_ids)} users and {len(recipe_ids)} "
+                f"recipes in {time.perf_counter() - start:.1f}s."
+            )
+        )
+
+    def bulk_create(self, model, objs):
+        """Пакетная запись объектов, возвращает созданные объекты."""
+        objs = iter(objs)
+        created = []
+        while batch := list(islice(objs, self.batch_size)):
+            created += model.objects.bulk_create(batch)
+        return created
+
+    def tags(self):
+        tag_ids = list(Tag.objects.values_list("id", flat=True))
+        if tag_ids:
+            return tag_ids
+        return [
+            tag.id
+            for tag in self.bulk_create(
+                Tag,
+                (
+                    Tag(name=f"Тег {i}", color="#000000", slug=f"tag-{i}")
+                    for i in range(10)
+                ),
+            )
+        ]
+
+    def image(self):
+        if default_storage.exists(IMAGE_NAME):
+            return
+        buffer = io.BytesIO()
+        Image.new("RGB", (600, 400), "orange").save(buffer, format="PNG")
+        default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+
+    def users(self, count):
+        prefix = f"synthetic{time.time_ns()}"
+        return [
+            user.id
+            for user in self.bulk_create(
+                User,
+                (
+                    User(
+                        username=f"{prefix}_{i}",
+                        email=f"{prefix}_{i}@example.com",
+                        first_name="Имя",
+                        last_name="Фамилия",
+                        password=make_password(None),
+                    )
+                    for i in range(count)
+                ),
+            )
+        ]
+
+    def recipes(self, user_ids, per_user, ingredient_ids, tag_ids):
+        recipe_ids = []
+        authors = (author for author in user_ids for _ in range(per_user))
+        while batch := list(islice(authors, self.batch_size)):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    name=f"Рецепт {self.random.randrange(10 ** 6)}",
+                    author_id=author,
+                    image=IMAGE_NAME,
+                    text="Синтетический рецепт.",
+                    cooking_time=self.random.randint(5, 180),
+                )
+                for author in batch
+            )
+            self.bulk_create(
+                IngredientInRecipe,
+                (
+                    IngredientInRecipe(
+                        recipe=recipe,
+                        ingredient_id=ingredient_id,
+                        amount=self.random.randint(1, 500),
+                    )
+                    for recipe in recipes
+                    for ingredient_id in self.random.sample(
+                        ingredient_ids, self.random.randint(5, 15)
+                    )
+                ),
+            )
+            self.bulk_create(
+                TagInRecipe,
+                (
+                    TagInRecipe(recipe=recipe, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in self.random.sample(
+                        tag_ids, self.random.randint(1, min(3, len(tag_ids)))
+                    )
+                ),
+            )
+            recipe_ids += [recipe.id for recipe in recipes]
+        return recipe_ids
+
+    def links(self, model, field, user_ids, target_ids, per_user):
+        """Связи пользователей с случайными объектами без повторов."""
+        self.bulk_create(
+            model,
+            (
+                model(user_id=user_id, **{field: target_id})
+                for user_id in user_ids
+                for target_id in self.random.sample(
+                    target_ids, min(per_user, len(target_ids))
+                )
+                if target_id != user_id or model is not Follow
+            ),
+        )
@@ -1,19 +1,18 @@
-import csv
-
-from django.core.management.base import BaseCommand
+from django.conf import settings
 
+from recipes.autocomplete import ingredient_index
+from recipes.management.commands._loader import BaseLoadCommand
 from recipes.models import Ingredient
 
 
-class Command(BaseCommand):
+class Command(BaseLoadCommand):
     help = "import data from ingredients.csv"
 
-    def handle(self, *args, **kwargs):
-        with open("data/ingredients.csv", encoding="utf8") as f:
-            reader_object = csv.reader(f, delimiter=",")
-            for row in reader_object:
-                obj = Ingredient(
-                    name=row[0],
-                    measurement_unit=row[1],
-                )
-                obj.save()
+    model = Ingredient
+    fields = ("name", "measurement_unit")
+    unique_fields = ("name",)
+    default_path = str(settings.BASE_DIR / "data" / "ingredients.csv")
+
+    def after_load(self):
+        super().after_load()
+        ingredient_index.invalidate()
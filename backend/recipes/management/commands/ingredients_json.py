@@ -0,0 +1,12 @@
+from django.conf import settings
+
+from recipes.management.commands.ingredients_csv import (
+    Command as IngredientsCommand,
+)
+
+
+class Command(IngredientsCommand):
+    help = "import data from ingredients.json"
+
+    # JSON-файл лежит только в каталоге data в корне репозитория.
+    default_path = str(settings.BASE_DIR.parent / "data" / "ingredients.json")
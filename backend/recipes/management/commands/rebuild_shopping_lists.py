@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Basket, IngredientInRecipe, ShoppingListItem
+from recipes.shopping_lists import rebuild
+
+
+class Command(BaseCommand):
+    help = "verify and repair the precomputed shopping lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the rows that differ from the baskets.",
+        )
+
+    def handle(self, *args, **options):
+        fix = not options["dry_run"]
+        with transaction.atomic():
+            rows = rebuild(
+                ShoppingListItem, Basket, IngredientInRecipe, fix=fix
+            )
+        message = "Repaired" if fix else "Found"
+        self.stdout.write(
+            self.style.SUCCESS(f"{message} {rows} drifted shopping list rows.")
+        )
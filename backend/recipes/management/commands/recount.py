@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount
+from recipes.models import Basket, Favorite, Recipe
+from users.models import CustomUser as User
+
+
+class Command(BaseCommand):
+    help = "recount favorites, baskets and user recipes counters"
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            recipes, users = recount(Recipe, Favorite, Basket, User)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Repaired {recipes} recipes and {users} users counters."
+            )
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+
+from recipes.models import Basket, Favorite, RecipePopularity
+from recipes.popularity import refresh
+
+
+class Command(BaseCommand):
+    help = "recompute the time-decayed popularity of recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=None,
+            help="Keep running and refresh every given number of seconds.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            with transaction.atomic():
+                updated, deleted = refresh(RecipePopularity, Favorite, Basket)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Scored {updated} recipes, removed {deleted} in "
+                    f"{time.perf_counter() - start:.2f}s."
+                )
+            )
+            if options["every"] is None:
+                return
+            close_old_connections()
+            time.sleep(options["every"])
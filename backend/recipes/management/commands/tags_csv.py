@@ -1,16 +1,13 @@
-import csv
-
-from django.core.management.base import BaseCommand
+from django.conf import settings
 
+from recipes.management.commands._loader import BaseLoadCommand
 from recipes.models import Tag
 
 
-class Command(BaseCommand):
-    help = "import data from ingredients.csv"
+class Command(BaseLoadCommand):
+    help = "import data from tags.csv"
 
-    def handle(self, *args, **kwargs):
-        with open("data/tags.csv", encoding="utf8") as f:
-            reader_object = csv.reader(f, delimiter=",")
-            for row in reader_object:
-                obj = Tag(name=row[0], color=row[1], slug=row[2])
-                obj.save()
+    model = Tag
+    fields = ("name", "color", "slug")
+    unique_fields = ("slug",)
+    default_path = str(settings.BASE_DIR / "data" / "tags.csv")
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.4 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+FILL_COUNTERS = """
+    UPDATE recipes_recipe recipe SET
+        favorites_count = (
+            SELECT COUNT(*) FROM recipes_favorite favorite
+            WHERE favorite.recipe_id = recipe.id
+        ),
+        baskets_count = (
+            SELECT COUNT(*) FROM recipes_basket basket
+            WHERE basket.recipe_id = recipe.id
+        );
+    UPDATE users_customuser author SET recipes_count = (
+        SELECT COUNT(*) FROM recipes_recipe recipe
+        WHERE recipe.author_id = author.id
+    );
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_ingredient_name_search_indexes'),
+        ('users', '0002_customuser_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='baskets_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunSQL(FILL_COUNTERS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.4 on 2026-10-18 05:22
+
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+FILL_POPULARITY = """
+    INSERT INTO recipes_recipepopularity (recipe_id, score)
+    SELECT recipe_id, SUM(
+        exp(-%(decay)s * extract(epoch FROM now() - created)::float)
+    )
+    FROM (
+        SELECT recipe_id, created FROM recipes_favorite
+        UNION ALL
+        SELECT recipe_id, created FROM recipes_basket
+    ) events
+    WHERE created > now() - %(period)s * interval '1 second'
+    GROUP BY recipe_id
+"""
+
+
+def fill_popularity(apps, schema_editor):
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS * 24 * 60 * 60
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            FILL_POPULARITY,
+            {"decay": math.log(2) / half_life, "period": half_life * 8},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shopping_list_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipePopularity',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(verbose_name='Популярность')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+            },
+        ),
+        migrations.AddField(
+            model_name='basket',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='basket',
+            index=models.Index(fields=['created'], name='basket_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['created'], name='favorite_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipepopularity',
+            index=models.Index(fields=['-score', '-recipe'], name='recipe_popularity_idx'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.db.models.functions import Upper
 
 from users.models import CustomUser as User
+from users.utils import fields_to_save
 
 
 class Tag(models.Model):
@@ -48,11 +53,75 @@ class Ingredient(models.Model):
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
         unique_together = ("name", "measurement_unit")
+        indexes = [
+            models.Index(
+                OpClass(Upper("name"), name="text_pattern_ops"),
+                name="ingredient_name_prefix_idx",
+            ),
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="ingredient_name_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов."""
+
+    def with_related(self, user):
+        """
+        Рецепты со связанными объектами и признаками пользователя,
+        необходимыми для RecipeGetSerializer. Поисковый вектор
+        в ответ не входит и не загружается.
+        """
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=user, following=OuterRef("pk")
+                    )
+                )
+            )
+        return (
+            self.prefetch_related(Prefetch("author", queryset=authors))
+            .with_tags_and_ingredients()
+            .annotate_user_flags(user)
+            .defer("search_vector")
+        )
+
+    def with_tags_and_ingredients(self):
+        """Рецепты с предзагруженными тегами и ингредиентами."""
+        return self.prefetch_related(
+            "tags",
+            Prefetch(
+                "recipe_in",
+                queryset=IngredientInRecipe.objects.select_related(
+                    "ingredient"
+                ),
+            ),
+        )
+
+    def annotate_user_flags(self, user):
+        """Признаки нахождения рецепта в избранном и списке покупок."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                Basket.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+        )
+
+
 class Recipe(models.Model):
     """Рецепты."""
 
@@ -67,12 +136,18 @@ class Recipe(models.Model):
         blank=False,
         related_name="recipes",
         verbose_name="Пользователь",
+        db_index=False,
     )
     image = models.ImageField(
         verbose_name="Изображение",
         upload_to="data/images/",
         blank=False,
     )
+    image_width = models.PositiveIntegerField(
+        verbose_name="Ширина изображения",
+        null=True,
+        editable=False,
+    )
     text = models.CharField(max_length=255, verbose_name="Описание блюда")
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -94,15 +169,72 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name="Дата публикации"
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        editable=False,
+    )
+    baskets_count = models.PositiveIntegerField(
+        verbose_name="В списках покупок",
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name="Поисковый вектор",
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    # Поля, которые меняются только UPDATE с F(), SQL-пересчётом
+    # и обработкой изображения и не записываются при обычном
+    # сохранении рецепта.
+    computed_fields = (
+        "favorites_count",
+        "baskets_count",
+        "search_vector",
+        "image_width",
+    )
+    # Имя изображения при чтении из базы: по нему сигналы узнают,
+    # что изображение заменили.
+    loaded_image_name = None
 
     class Meta:
         ordering = ("-pub_date",)
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="recipe_pub_date_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="recipe_author_pub_date_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="recipe_search_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        recipe.loaded_image_name = recipe.__dict__.get("image")
+        return recipe
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = fields_to_save(
+                self, self.computed_fields
+            )
+        super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     """Подписка."""
@@ -140,11 +272,13 @@ class TagInRecipe(models.Model):
         Tag,
         on_delete=models.CASCADE,
         related_name="tag_in",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name="tag_in",
+        db_index=False,
     )
 
     class Meta:
@@ -155,6 +289,9 @@ class TagInRecipe(models.Model):
                 fields=["tag", "recipe"], name="recipe_tag_unique"
             )
         ]
+        indexes = [
+            models.Index(fields=["recipe", "tag"], name="tag_in_recipe_idx"),
+        ]
 
 
 class IngredientInRecipe(models.Model):
@@ -164,11 +301,13 @@ class IngredientInRecipe(models.Model):
         Ingredient,
         on_delete=models.CASCADE,
         related_name="ingredient_in",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name="recipe_in",
+        db_index=False,
     )
 
     amount = models.PositiveIntegerField(
@@ -184,6 +323,13 @@ class IngredientInRecipe(models.Model):
                 name="recipe_ingredient_unique",
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["recipe", "ingredient"],
+                include=["amount"],
+                name="ingredient_in_recipe_idx",
+            ),
+        ]
 
 
 class Basket(models.Model):
@@ -194,12 +340,18 @@ class Basket(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Пользователь",
         related_name="baskets",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
         related_name="baskets",
+        db_index=False,
+    )
+
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name="Дата добавления"
     )
 
     class Meta:
@@ -211,6 +363,12 @@ class Basket(models.Model):
                 fields=["user", "recipe"], name="unique_name_basket_recipe"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["recipe", "user"], name="basket_recipe_user_idx"
+            ),
+            models.Index(fields=["created"], name="basket_created_idx"),
+        ]
 
 
 class Favorite(models.Model):
@@ -221,12 +379,18 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Пользователь",
         related_name="user_favorite",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
         related_name="recipe_favorite",
+        db_index=False,
+    )
+
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name="Дата добавления"
     )
 
     class Meta:
@@ -238,3 +402,68 @@ class Favorite(models.Model):
                 fields=["user", "recipe"], name="unique_name_favorite_recipe"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["recipe", "user"], name="favorite_recipe_user_idx"
+            ),
+            models.Index(fields=["created"], name="favorite_created_idx"),
+        ]
+
+
+class RecipePopularity(models.Model):
+    """
+    Популярность рецепта: сумма добавлений в избранное и в корзину
+    с весом, убывающим со временем (см. recipes.popularity).
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="popularity",
+        verbose_name="Рецепт",
+    )
+    score = models.FloatField(verbose_name="Популярность")
+
+    class Meta:
+        verbose_name = "Популярность рецепта"
+        verbose_name_plural = "Популярность рецептов"
+        indexes = [
+            models.Index(
+                fields=["-score", "-recipe"], name="recipe_popularity_idx"
+            ),
+        ]
+
+
+class ShoppingListItem(models.Model):
+    """
+    Итоговое количество ингредиента в списке покупок пользователя.
+
+    Обновляется при добавлении и удалении рецептов из корзины
+    и при изменении ингредиентов рецепта (см. recipes.shopping_lists).
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="shopping_list",
+        db_index=False,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name="Ингредиент",
+        related_name="shopping_list_items",
+    )
+    total_amount = models.IntegerField(verbose_name="Количество")
+
+    class Meta:
+        verbose_name = "Ингредиент списка покупок"
+        verbose_name_plural = "Ингредиенты списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_shopping_list_ingredient",
+            )
+        ]
@@ -0,0 +1,70 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+FAVORITE_WEIGHT = 1.0
+BASKET_WEIGHT = 1.0
+# События старше HALF_LIVES периодов полураспада дают меньше 0,5 %
+# веса и в расчёт не берутся, чтобы не читать таблицы целиком.
+HALF_LIVES = 8
+
+REFRESH = """
+    WITH events AS (
+        SELECT recipe_id, created, %(favorite_weight)s::float AS weight
+        FROM {favorite} WHERE created > %(since)s
+        UNION ALL
+        SELECT recipe_id, created, %(basket_weight)s::float AS weight
+        FROM {basket} WHERE created > %(since)s
+    ), scores AS (
+        SELECT recipe_id, SUM(
+            weight * exp(
+                -%(decay)s * extract(epoch FROM %(now)s - created)::float
+            )
+        ) AS score
+        FROM events GROUP BY recipe_id
+    ), updated AS (
+        INSERT INTO {popularity} (recipe_id, score)
+        SELECT recipe_id, score FROM scores
+        ON CONFLICT (recipe_id) DO UPDATE SET score = EXCLUDED.score
+        RETURNING recipe_id
+    ), deleted AS (
+        DELETE FROM {popularity} popularity WHERE NOT EXISTS (
+            SELECT 1 FROM scores WHERE scores.recipe_id = popularity.recipe_id
+        )
+        RETURNING recipe_id
+    )
+    SELECT (SELECT COUNT(*) FROM updated), (SELECT COUNT(*) FROM deleted)
+"""
+
+
+def refresh(popularity_model, favorite_model, basket_model, now=None):
+    """
+    Пересчёт популярности всех рецептов одним запросом.
+
+    Каждое добавление в избранное или корзину весит тем меньше, чем
+    оно старше: вес уменьшается вдвое за POPULARITY_HALF_LIFE_DAYS.
+    Рецепты без недавних событий из таблицы удаляются.
+    Возвращает количество обновлённых и удалённых строк.
+    """
+    now = now or timezone.now()
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS * 24 * 60 * 60
+    sql = REFRESH.format(
+        popularity=popularity_model._meta.db_table,
+        favorite=favorite_model._meta.db_table,
+        basket=basket_model._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            {
+                "favorite_weight": FAVORITE_WEIGHT,
+                "basket_weight": BASKET_WEIGHT,
+                "decay": math.log(2) / half_life,
+                "now": now,
+                "since": now - timedelta(seconds=half_life * HALF_LIVES),
+            },
+        )
+        return cursor.fetchone()
@@ -0,0 +1,68 @@
+from django.db import connection
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+
+# Конфигурация полнотекстового поиска PostgreSQL со стеммингом.
+SEARCH_CONFIG = "russian"
+
+UPDATE = """
+    UPDATE {recipe} recipe SET search_vector =
+        setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A')
+        || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM {recipe_in} recipe_in
+            JOIN {ingredient} ingredient
+            ON ingredient.id = recipe_in.ingredient_id
+            WHERE recipe_in.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C')
+    WHERE {condition}
+"""
+
+
+def tables(recipe_model, ingredient_in_recipe_model, ingredient_model):
+    return {
+        "recipe": recipe_model._meta.db_table,
+        "recipe_in": ingredient_in_recipe_model._meta.db_table,
+        "ingredient": ingredient_model._meta.db_table,
+    }
+
+
+TABLES = tables(Recipe, IngredientInRecipe, Ingredient)
+
+
+def update(condition, params, names=TABLES):
+    """
+    Пересчёт поискового вектора рецептов, подходящих под condition:
+    название с весом A, названия ингредиентов — B, описание — C.
+    Возвращает количество обновлённых рецептов.
+    """
+    sql = UPDATE.format(condition=condition.format(**names), **names)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"config": SEARCH_CONFIG, **params})
+        return cursor.rowcount
+
+
+def update_recipes(recipe_ids):
+    """Пересчёт поискового вектора рецептов."""
+    update("recipe.id = ANY(%(ids)s)", {"ids": list(recipe_ids)})
+
+
+def update_ingredient(ingredient_id):
+    """Пересчёт поискового вектора рецептов с ингредиентом."""
+    update(
+        """recipe.id IN (
+            SELECT recipe_id FROM {recipe_in}
+            WHERE ingredient_id = %(ingredient)s
+        )""",
+        {"ingredient": ingredient_id},
+    )
+
+
+def rebuild(recipe_model, ingredient_in_recipe_model, ingredient_model):
+    """Пересчёт поискового вектора всех рецептов."""
+    return update(
+        "TRUE",
+        {},
+        tables(recipe_model, ingredient_in_recipe_model, ingredient_model),
+    )
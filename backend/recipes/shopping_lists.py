@@ -0,0 +1,131 @@
+from django.db import connection
+
+from recipes.models import Basket, IngredientInRecipe, ShoppingListItem
+
+UPSERT = """
+    INSERT INTO {items} (user_id, ingredient_id, total_amount)
+    {select}
+    ON CONFLICT (user_id, ingredient_id) DO UPDATE
+    SET total_amount = {items}.total_amount + EXCLUDED.total_amount
+"""
+
+DELETE_EMPTY = """
+    DELETE FROM {items} WHERE total_amount <= 0 AND user_id IN ({users})
+"""
+
+ACTUAL = """
+    SELECT basket.user_id, recipe_in.ingredient_id,
+           SUM(recipe_in.amount) AS total_amount
+    FROM {basket} basket
+    JOIN {recipe_in} recipe_in ON recipe_in.recipe_id = basket.recipe_id
+    GROUP BY basket.user_id, recipe_in.ingredient_id
+"""
+
+
+def tables(item_model, basket_model, ingredient_in_recipe_model):
+    return {
+        "items": item_model._meta.db_table,
+        "basket": basket_model._meta.db_table,
+        "recipe_in": ingredient_in_recipe_model._meta.db_table,
+    }
+
+
+TABLES = tables(ShoppingListItem, Basket, IngredientInRecipe)
+
+
+def upsert(cursor, select, params):
+    """Прибавление к спискам покупок строк (user, ingredient, amount)."""
+    select = select.format(**TABLES)
+    cursor.execute(UPSERT.format(select=select, **TABLES), params)
+
+
+def change_basket(user_id, recipe_ids, sign):
+    """
+    Добавление (sign=1) или вычитание (sign=-1) ингредиентов рецептов
+    recipe_ids в списке покупок пользователя.
+    """
+    select = """
+        SELECT %s, ingredient_id, %s * SUM(amount) FROM {recipe_in}
+        WHERE recipe_id = ANY(%s)
+        GROUP BY ingredient_id
+    """
+    with connection.cursor() as cursor:
+        upsert(cursor, select, [user_id, sign, list(recipe_ids)])
+        if sign < 0:
+            cursor.execute(
+                DELETE_EMPTY.format(users="%s", **TABLES), [user_id]
+            )
+
+
+def change_recipe(recipe_id, deltas):
+    """
+    Изменение количеств ингредиентов рецепта в списках покупок всех
+    пользователей, у которых он в корзине.
+
+    deltas — словарь {id ингредиента: изменение количества}.
+    """
+    deltas = {id: delta for id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    select = """
+        SELECT basket.user_id, delta.ingredient_id, delta.amount
+        FROM {basket} basket
+        CROSS JOIN unnest(%s::integer[], %s::integer[])
+            AS delta(ingredient_id, amount)
+        WHERE basket.recipe_id = %s
+    """
+    users = "SELECT user_id FROM {basket} WHERE recipe_id = %s".format(
+        **TABLES
+    )
+    with connection.cursor() as cursor:
+        upsert(
+            cursor, select, [list(deltas), list(deltas.values()), recipe_id]
+        )
+        cursor.execute(
+            DELETE_EMPTY.format(users=users, **TABLES), [recipe_id]
+        )
+
+
+def rebuild(item_model, basket_model, ingredient_in_recipe_model, fix=True):
+    """
+    Сверка списков покупок с корзинами.
+
+    Возвращает количество расходящихся строк; при fix=True они
+    исправляются: недостающие добавляются, неверные обновляются,
+    лишние удаляются.
+    """
+    names = tables(item_model, basket_model, ingredient_in_recipe_model)
+    actual = ACTUAL.format(**names)
+    with connection.cursor() as cursor:
+        if not fix:
+            cursor.execute(
+                f"""
+                SELECT COUNT(*) FROM ({actual}) actual
+                FULL OUTER JOIN {names['items']} items
+                USING (user_id, ingredient_id)
+                WHERE actual.total_amount IS DISTINCT FROM items.total_amount
+                """
+            )
+            return cursor.fetchone()[0]
+        cursor.execute(
+            f"""
+            INSERT INTO {names['items']} (user_id, ingredient_id, total_amount)
+            {actual}
+            ON CONFLICT (user_id, ingredient_id) DO UPDATE
+            SET total_amount = EXCLUDED.total_amount
+            WHERE {names['items']}.total_amount <> EXCLUDED.total_amount
+            """
+        )
+        changed = cursor.rowcount
+        cursor.execute(
+            f"""
+            DELETE FROM {names['items']} items WHERE NOT EXISTS (
+                SELECT 1 FROM {names['basket']} basket
+                JOIN {names['recipe_in']} recipe_in
+                ON recipe_in.recipe_id = basket.recipe_id
+                WHERE basket.user_id = items.user_id
+                AND recipe_in.ingredient_id = items.ingredient_id
+            )
+            """
+        )
+        return changed + cursor.rowcount
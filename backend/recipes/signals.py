@@ -0,0 +1,129 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.autocomplete import ingredient_index
+from recipes.cookable import cookable_index
+from recipes.counters import change_counter
+from recipes.feed import invalidate_author
+from recipes.images import schedule_image_processing, schedule_variants_removal
+from recipes.links import COUNTERS
+from recipes.models import Basket, Favorite, Ingredient, Recipe
+from recipes.search import update_ingredient, update_recipes
+from recipes.shopping_lists import change_basket
+from users.models import CustomUser as User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сброс индекса ингредиентов при изменении справочника."""
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search(instance, created, **kwargs):
+    """Пересчёт поискового вектора рецептов при изменении ингредиента."""
+    if not created:
+        update_ingredient(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(instance, **kwargs):
+    """
+    Пересчёт поискового вектора рецепта после фиксации транзакции,
+    когда его ингредиенты уже сохранены.
+    """
+    transaction.on_commit(partial(update_recipes, [instance.pk]))
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    """Увеличение счётчика рецептов автора."""
+    if created:
+        change_counter(User, instance.author_id, "recipes_count", 1)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, update_fields, **kwargs):
+    """
+    Фоновая обработка нового изображения рецепта и удаление копий
+    заменённого после фиксации транзакции. Сохранение без изменения
+    изображения его не обрабатывает.
+    """
+    if update_fields is not None and "image" not in update_fields:
+        return
+    name = instance.image.name or None
+    previous = instance.loaded_image_name
+    if name == previous:
+        return
+    instance.loaded_image_name = name
+    if name:
+        transaction.on_commit(partial(schedule_image_processing, name))
+    if previous:
+        # Копий нового изображения ещё нет.
+        instance.image_width = None
+        Recipe.objects.filter(pk=instance.pk).update(image_width=None)
+        transaction.on_commit(partial(schedule_variants_removal, previous))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_image_variants(instance, **kwargs):
+    """Удаление копий изображения удалённого рецепта."""
+    if instance.image:
+        transaction.on_commit(
+            partial(schedule_variants_removal, instance.image.name)
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_author_feed(instance, created=True, **kwargs):
+    """Сброс кэша последних рецептов автора после фиксации транзакции."""
+    if created:
+        transaction.on_commit(partial(invalidate_author, instance.author_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_cookable_index(instance, **kwargs):
+    """Удаление рецепта из индекса подбора по продуктам."""
+    transaction.on_commit(
+        partial(cookable_index.remove_recipe, instance.pk)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    """Уменьшение счётчика рецептов автора."""
+    change_counter(User, instance.author_id, "recipes_count", -1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Basket)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    """Увеличение счётчика избранного или списков покупок рецепта."""
+    if created:
+        change_counter(Recipe, instance.recipe_id, COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Basket)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    """Уменьшение счётчика избранного или списков покупок рецепта."""
+    change_counter(Recipe, instance.recipe_id, COUNTERS[sender], -1)
+
+
+@receiver(post_save, sender=Basket)
+def add_to_shopping_list(instance, created, **kwargs):
+    """Добавление ингредиентов рецепта в список покупок."""
+    if created:
+        change_basket(instance.user_id, [instance.recipe_id], 1)
+
+
+@receiver(pre_delete, sender=Basket)
+def remove_from_shopping_list(instance, **kwargs):
+    """
+    Вычитание ингредиентов рецепта из списка покупок. Выполняется
+    до удаления, пока ингредиенты удаляемого рецепта ещё на месте.
+    """
+    change_basket(instance.user_id, [instance.recipe_id], -1)
@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.db import models
 
+from users.utils import fields_to_save
+
 username_validator = RegexValidator(
     regex=r"^[\w.@+-]+$",
     message=(
@@ -40,10 +42,17 @@ class CustomUser(AbstractUser):
     password = models.CharField(
         verbose_name="Пароль",
         max_length=100,
-        unique=True,
         blank=False,
         null=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+        editable=False,
+    )
+    # Счётчик меняется только UPDATE с F() и не записывается
+    # при обычном сохранении пользователя.
+    computed_fields = ("recipes_count",)
     REQUIRED_FIELDS = [
         "username",
         "first_name",
@@ -58,3 +67,14 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = fields_to_save(
+                self, self.computed_fields
+            )
+        super().save(*args, **kwargs)
@@ -0,0 +1,14 @@
+def fields_to_save(instance, excluded):
+    """
+    Поля для обычного сохранения объекта без полей excluded, которые
+    меняются только отдельными UPDATE: полная запись строки вернула бы
+    значения, прочитанные до параллельных изменений.
+    """
+    deferred = instance.get_deferred_fields()
+    return [
+        field.name
+        for field in instance._meta.concrete_fields
+        if not field.primary_key
+        and field.attname not in deferred
+        and field.name not in excluded
+    ]